@@ -6,7 +6,7 @@ from typing import Dict, Any, List
 from core.agent_flow import AgentFlow
 
 # Dictionary to hold registered agent_flows
-AGENT_FLOWS: Dict[str, AgentFlow] = {}
+AGENT_FLOWS: Dict[str, AgentFlow]  # Populated on first access, see __getattr__
 
 
 def register_agent_flows():
@@ -14,6 +14,7 @@ def register_agent_flows():
     Dynamically finds and registers all predefined Agent_Flow instances.
     """
     package_name = __name__
+    registry = {}
 
     for _, module_name, _ in pkgutil.iter_modules(__path__):
         module = importlib.import_module(f"{package_name}.{module_name}")
@@ -24,8 +25,14 @@ def register_agent_flows():
             if isinstance(attr, AgentFlow):
                 if not attr.name:  # Assign module name as default name if missing
                     attr.name = module_name
-                AGENT_FLOWS[attr.name.lower().replace(" ", "_")] = attr  # Normalize name
+                registry[attr.name.lower().replace(" ", "_")] = attr  # Normalize name
 
+    globals()["AGENT_FLOWS"] = registry
+    return registry
 
-# Load agent flows when the package is imported
-register_agent_flows()
\ No newline at end of file
+
+def __getattr__(name):
+    """Registers agent flows lazily, on the first lookup of ``AGENT_FLOWS``."""
+    if name == "AGENT_FLOWS":
+        return register_agent_flows()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
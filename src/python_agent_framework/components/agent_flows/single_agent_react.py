@@ -5,22 +5,29 @@ from core.agent_flow import AgentFlow
 from core.agent import Agent
 from core.memory import Memory
 from core.tool_manager import ToolManager
-from llm.chat_completion import ChatCompletionHandler
+from llm.chat_completion import get_chat_handler
 from utilities.pretty_print_conversation import pretty_print_conversation
 from typing import Any, Dict, List, Optional
 from dataclasses import dataclass, field
 import asyncio
+import os
+
+
+# Stream replies token by token (and start tools while the model is still responding)
+REACT_STREAM = os.getenv("REACT_STREAM", "false").lower() == "true"
 
 
 @dataclass
 class SingleAgentReAct(AgentFlow):    
     max_iterations: int = 5
+    stream: bool = REACT_STREAM
     
     
     async def execute(self, agent: Agent) -> str:
-        chat_handler = ChatCompletionHandler(base_url=self.connection.base_url,
-                                             api_key=self.connection.api_key,
-                                             model=self.connection.model)
+        # Shared per (base_url, api_key, model); concurrent runs reuse its pooled connections
+        chat_handler = get_chat_handler(base_url=self.connection.base_url,
+                                        api_key=self.connection.api_key,
+                                        model=self.connection.model)
         assistant_message = None
         
         for user_input in agent.user_inputs:
@@ -28,11 +35,8 @@ class SingleAgentReAct(AgentFlow):
             agent.memory.add_message(user_input)
 
             # Make chat completion request
-            chat_response = chat_handler.chat_completion_request(
-                messages=agent.memory.get_messages(),
-                tools=ToolManager.selected_tools(agent.tools),
-            )
-            assistant_message = chat_response.choices[0].message
+            assistant_message, tool_messages = await self.next_turn(chat_handler, agent,
+                                                                    start_tools=self.max_iterations > 0)
             
             # Add the assistant's content to memory
             agent.memory.add_message(assistant_message)
@@ -41,24 +45,68 @@ class SingleAgentReAct(AgentFlow):
             if assistant_message.tool_calls:
                 iterations = 0
                 while assistant_message.tool_calls and (iterations := iterations + 1) <= self.max_iterations:
-                    tool_messages = await ToolManager.invoke_tools(assistant_message.tool_calls)
+                    if tool_messages is None:
+                        tool_messages = await ToolManager.invoke_tools(assistant_message.tool_calls)
                     for tool_message in tool_messages:
                         # Add each tool message to memory
                         agent.memory.add_message(tool_message)
                     
-                    chat_response = chat_handler.chat_completion_request(
-                        messages=agent.memory.get_messages(),
-                        tools=ToolManager.selected_tools(agent.tools),
-                    )
-                    assistant_message = chat_response.choices[0].message        
+                    # The tools of this turn only run if the loop allows another iteration
+                    assistant_message, tool_messages = await self.next_turn(
+                        chat_handler, agent, start_tools=iterations < self.max_iterations)
                     
                     # Directly add the assistant's content to memory without conversion
                     agent.memory.add_message(assistant_message)   
               
-            pretty_print_conversation(agent.memory.get_messages())  
+            if not self.stream:
+                pretty_print_conversation(agent.memory.get_messages())  
             return assistant_message.content
 
 
+    async def next_turn(self, chat_handler, agent: Agent, start_tools: bool = True):
+        """
+        Requests the assistant's next message.
+
+        When streaming, content is printed as it arrives and every tool call
+        is started as soon as it has been fully streamed.
+
+        :param start_tools: Whether streamed tool calls may be started early;
+                            False once the iteration budget is spent.
+        :return: (assistant_message, tool messages); the tool messages are None
+                 if the tools were not run yet.
+        """
+        messages = agent.memory.get_messages()
+        tools = ToolManager.selected_tools(agent.tools)
+        if not self.stream:
+            chat_response = await chat_handler.achat_completion_request(messages=messages, tools=tools)
+            return chat_response.choices[0].message, None
+
+        tool_tasks = []
+        chat_response = None
+        try:
+            async for event in chat_handler.astream_chat_completion_request(messages=messages, tools=tools):
+                if event.type == "content":
+                    print(event.content, end="", flush=True)
+                elif event.type == "tool_call":
+                    if start_tools:
+                        tool_tasks.append(asyncio.create_task(ToolManager.invoke_tools([event.tool_call])))
+                else:
+                    chat_response = event.response
+        except BaseException:
+            for task in tool_tasks:
+                task.cancel()
+            raise
+
+        assistant_message = chat_response.choices[0].message
+        if assistant_message.content:
+            print()
+        if not start_tools:
+            return assistant_message, None
+        # Tool messages stay in tool call order, whatever order the tools finished in
+        tool_messages = [tool_message for task in tool_tasks for tool_message in await task]
+        return assistant_message, tool_messages
+
+
 agent_flow = SingleAgentReAct(description =
                     """
                     ReAct pattern (Reason + Act)
@@ -6,7 +6,7 @@ from typing import Dict, Any, List
 from core.agent import Agent
 
 # Dictionary to hold registered agents
-AGENTS: Dict[str, Agent] = {}
+AGENTS: Dict[str, Agent]  # Populated on first access, see __getattr__
 
 
 def load_agents():
@@ -14,6 +14,7 @@ def load_agents():
     Dynamically finds and registers all predefined Agent instances.
     """
     package_name = __name__
+    registry = {}
 
     for _, module_name, _ in pkgutil.iter_modules(__path__):
         module = importlib.import_module(f"{package_name}.{module_name}")
@@ -24,8 +25,14 @@ def load_agents():
             if isinstance(attr, Agent):
                 if not attr.name:
                     attr.name = module_name  # Assign module name as default name if missing
-                AGENTS[attr.name.lower().replace(" ", "_")] = attr  # Normalize name
+                registry[attr.name.lower().replace(" ", "_")] = attr  # Normalize name
 
+    globals()["AGENTS"] = registry
+    return registry
 
-# Load agents when the package is imported
-load_agents()
\ No newline at end of file
+
+def __getattr__(name):
+    """Registers the agents on first access to ``AGENTS`` instead of at package import."""
+    if name == "AGENTS":
+        return load_agents()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
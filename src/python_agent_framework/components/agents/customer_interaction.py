@@ -1,11 +1,23 @@
-import smtplib
-from email.mime.text import MIMEText
-from crewai import Agent
+import functools
 from components.connections.database import fetch_invoice
+from components.connections.mail import get_transport
+from utilities.lazy_imports import lazy_import
+
+crewai = lazy_import("crewai")
 
 class CustomerInteractionAgent:
-    def __init__(self):
-        self.agent = Agent(
+    def __init__(self, outbox=None, transport=None):
+        """
+        :param outbox: Optional NotificationOutbox; emails are then queued and sent as per-recipient digests.
+        :param transport: Mail transport for immediate sends (defaults to the environment's configuration).
+        """
+        self.outbox = outbox
+        self.transport = transport or (outbox.transport if outbox else get_transport())
+
+    @functools.cached_property
+    def agent(self):
+        """CrewAI agent, only constructed when CrewAI orchestration asks for it."""
+        return crewai.Agent(
             role="Customer Interaction Agent",
             goal="Communicate invoice status to vendors and finance teams.",
             backstory=(
@@ -16,14 +28,21 @@ class CustomerInteractionAgent:
         )
 
     def send_email(self, recipient, subject, body):
-        """Sends an email notification (MVP: Replace with actual SMTP credentials)."""
-        print(f"\n📧 Sending Email to {recipient}...")
-        print(f"📌 Subject: {subject}")
-        print(f"📝 Body: {body}\n")
+        """Sends an email notification, or queues it in the outbox for the recipient's next digest."""
+        if self.outbox is not None:
+            self.outbox.add(recipient, subject, body)
+        else:
+            self.transport.send(recipient, subject, body)
+
+    def notify_vendor(self, invoice_id, invoice_data=None):
+        """
+        Notifies the vendor about invoice status.
 
-    def notify_vendor(self, invoice_id):
-        """Notifies the vendor about invoice status."""
-        invoice_data = fetch_invoice(invoice_id)
+        Callers that already hold the invoice can pass it as ``invoice_data``
+        to skip the database lookup.
+        """
+        if invoice_data is None:
+            invoice_data = fetch_invoice(invoice_id, include_line_items=False)
         if not invoice_data:
             print("⚠️ Error: Invoice not found.")
             return
@@ -56,7 +75,7 @@ class CustomerInteractionAgent:
 
         self.send_email(finance_email, subject, body)
 
-    def handle_invoice_communication(self, invoice_id, validation_results, fraud_results):
+    def handle_invoice_communication(self, invoice_id, validation_results, fraud_results, invoice_data=None):
         """Decides whether to notify the vendor or escalate to finance team."""
         if not validation_results["valid"]:
             print(f"❌ Invoice {invoice_id} has errors and will not be processed.")
@@ -67,4 +86,4 @@ class CustomerInteractionAgent:
             self.notify_finance_team(invoice_id, fraud_results["warnings"])
         else:
             print(f"✅ Invoice {invoice_id} is valid. Notifying vendor...")
-            self.notify_vendor(invoice_id)
+            self.notify_vendor(invoice_id, invoice_data)
@@ -1,11 +1,32 @@
-import json
-import sqlite3
-from crewai import Agent
-from components.connections.database import fetch_invoice, DB_PATH
+import functools
+from components.connections.database import (
+    fetch_invoice, fetch_vendor_baseline, find_duplicate_invoices, find_near_duplicates, get_connection,
+    line_items_total, load_invoice_columns
+)
+from utilities.near_duplicates import due_day
+from utilities.running_stats import z_score
+from utilities.lazy_imports import lazy_import
+
+# Heavy SDKs, imported on first use
+crewai = lazy_import("crewai")
+np = lazy_import("numpy")
+
+# Thresholds shared by the per-invoice and batch checks
+TOTAL_MISMATCH_TOLERANCE = 1.0
+MAX_TAX_RATIO = 0.3
+
+# Vendor-history anomaly checks
+MIN_VENDOR_HISTORY = 5         # Invoices needed before a vendor's statistics are trusted
+Z_SCORE_THRESHOLD = 3.0
+MIN_TOTAL_STD_RATIO = 0.05     # Std floor for totals, relative to the vendor's mean total
+MIN_TAX_RATIO_STD = 0.01
+EARLY_CADENCE_RATIO = 0.5      # Flag due dates closer than half the vendor's usual gap
 
 class DataAnalysisAgent:
-    def __init__(self):
-        self.agent = Agent(
+    @functools.cached_property
+    def agent(self):
+        """CrewAI agent for orchestrated runs; the validation and fraud checks are plain Python and do not use it."""
+        return crewai.Agent(
             role="Data Analyst",
             goal="Validate invoice details, detect potential fraud, and generate financial insights.",
             backstory=(
@@ -15,8 +36,13 @@ class DataAnalysisAgent:
             )
         )
 
-    def validate_invoice(self, invoice_data):
-        """Checks for missing fields and ensures tax & total calculations are correct."""
+    def validate_invoice(self, invoice_data, calculated_total=None):
+        """
+        Checks for missing fields and ensures tax & total calculations are correct.
+
+        ``calculated_total`` may be supplied (e.g. from a SQL aggregate) instead
+        of summing ``invoice_data["Line_Items"]``.
+        """
         errors = []
         if not invoice_data.get("Invoice_ID"):
             errors.append("Missing Invoice ID")
@@ -30,8 +56,9 @@ class DataAnalysisAgent:
             errors.append("Missing Due Date")
 
         # Validate total amount calculation
-        calculated_total = sum(item["Quantity"] * item["Price"] for item in invoice_data.get("Line_Items", []))
-        if abs(calculated_total - invoice_data.get("Total_Amount", 0)) > 1.0:
+        if calculated_total is None:
+            calculated_total = sum(item["Quantity"] * item["Price"] for item in invoice_data.get("Line_Items", []))
+        if abs(calculated_total - invoice_data.get("Total_Amount", 0)) > TOTAL_MISMATCH_TOLERANCE:
             errors.append(f"Total Amount Mismatch: Expected {calculated_total}, but got {invoice_data['Total_Amount']}")
 
         return {
@@ -39,19 +66,42 @@ class DataAnalysisAgent:
             "errors": errors
         }
 
-    def detect_fraud(self, invoice_data, past_invoices):
-        """Detects duplicate invoices and unusual tax rates."""
+    def detect_fraud(self, invoice_data, past_invoices=None):
+        """
+        Detects duplicate invoices and unusual tax rates.
+
+        When ``past_invoices`` is omitted, duplicates are found with an indexed
+        lookup on (vendor, total_amount, due_date) instead of a table scan, and
+        near-duplicates (reformatted vendor, slightly different total, shifted
+        due date) are searched for in the stored fingerprints.
+        """
         warnings = []
 
         # Check for duplicate invoices in the database
-        for past_invoice in past_invoices:
-            if (invoice_data["Vendor"] == past_invoice["Vendor"] and
-                invoice_data["Total_Amount"] == past_invoice["Total_Amount"] and
-                invoice_data["Due_Date"] == past_invoice["Due_Date"]):
-                warnings.append("⚠️ Potential Duplicate Invoice Detected.")
+        if past_invoices is None:
+            duplicate_ids = find_duplicate_invoices(
+                invoice_data["Vendor"],
+                invoice_data["Total_Amount"],
+                invoice_data["Due_Date"],
+                exclude_invoice_id=invoice_data.get("Invoice_ID"),
+            )
+        else:
+            duplicate_ids = [
+                past_invoice.get("Invoice_ID") for past_invoice in past_invoices
+                if (invoice_data["Vendor"] == past_invoice["Vendor"] and
+                    invoice_data["Total_Amount"] == past_invoice["Total_Amount"] and
+                    invoice_data["Due_Date"] == past_invoice["Due_Date"])
+            ]
+        for _ in duplicate_ids:
+            warnings.append("⚠️ Potential Duplicate Invoice Detected.")
+
+        if past_invoices is None:
+            for near_duplicate_id in find_near_duplicates(invoice_data, exclude_invoice_id=invoice_data.get("Invoice_ID")):
+                warnings.append(f"⚠️ Potential Near-Duplicate of Invoice {near_duplicate_id} Detected.")
+            warnings.extend(self.detect_vendor_anomalies(invoice_data))
 
         # Check for unusually high tax rates
-        if invoice_data["Tax"] > 0.3 * invoice_data["Total_Amount"]:  # More than 30% tax
+        if invoice_data["Tax"] > MAX_TAX_RATIO * invoice_data["Total_Amount"]:  # More than 30% tax
             warnings.append("⚠️ Unusually High Tax Rate Detected.")
 
         return {
@@ -59,15 +109,64 @@ class DataAnalysisAgent:
             "warnings": warnings
         }
 
+    def detect_vendor_anomalies(self, invoice_data, baseline=None):
+        """
+        Compares an invoice with its vendor's running statistics.
+
+        Flags totals and tax ratios more than Z_SCORE_THRESHOLD standard
+        deviations from the vendor's history, and due dates that come much
+        sooner than the vendor's usual cadence. ``baseline`` defaults to
+        ``fetch_vendor_baseline`` (one primary-key lookup).
+        """
+        if baseline is None:
+            baseline = fetch_vendor_baseline(invoice_data)
+        if baseline is None:
+            return []
+
+        warnings = []
+        total_amount = invoice_data.get("Total_Amount")
+        if total_amount is not None and baseline["total_count"] >= MIN_VENDOR_HISTORY:
+            score = z_score(total_amount, baseline["total_count"], baseline["total_mean"], baseline["total_m2"],
+                            min_std=MIN_TOTAL_STD_RATIO * abs(baseline["total_mean"]))
+            if score is not None and abs(score) > Z_SCORE_THRESHOLD:
+                warnings.append(
+                    f"⚠️ Unusual Total Amount for This Vendor Detected "
+                    f"(typical {baseline['total_mean']:.2f}, z-score {score:.1f})."
+                )
+
+        tax = invoice_data.get("Tax")
+        if total_amount and tax is not None and baseline["tax_ratio_count"] >= MIN_VENDOR_HISTORY:
+            score = z_score(tax / total_amount, baseline["tax_ratio_count"], baseline["tax_ratio_mean"],
+                            baseline["tax_ratio_m2"], min_std=MIN_TAX_RATIO_STD)
+            if score is not None and abs(score) > Z_SCORE_THRESHOLD:
+                warnings.append(f"⚠️ Unusual Tax Rate for This Vendor Detected (z-score {score:.1f}).")
+
+        day = due_day(invoice_data.get("Due_Date"))
+        if day is not None and baseline["last_due_day"] is not None and baseline["gap_count"] >= MIN_VENDOR_HISTORY - 1:
+            gap = day - baseline["last_due_day"]
+            if 0 <= gap < EARLY_CADENCE_RATIO * baseline["gap_mean"]:
+                warnings.append(
+                    f"⚠️ Invoice Due Sooner Than This Vendor's Usual Cadence "
+                    f"({gap} days after the previous one, typically {baseline['gap_mean']:.0f})."
+                )
+        return warnings
+
     def get_past_invoices(self, exclude_invoice_id):
-        """Fetches all past invoices from the database except the one currently being analyzed."""
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM invoices WHERE invoice_id != ?", (exclude_invoice_id,))
-        past_invoices = cursor.fetchall()
-        
-        conn.close()
+        """
+        Fetches all past invoices from the database except the one currently being analyzed.
+
+        This is a full table scan; ``detect_fraud`` no longer needs it.
+        """
+        with get_connection() as conn:
+            past_invoices = conn.execute(
+                "SELECT invoice_id, vendor, total_amount, tax, due_date FROM invoices WHERE invoice_id != ?",
+                (exclude_invoice_id,)
+            ).fetchall()
+            line_items = {}
+            for invoice_id, item, quantity, price in conn.execute(
+                "SELECT invoice_id, item, quantity, price FROM invoice_line_items ORDER BY invoice_id, position"
+            ):
+                line_items.setdefault(invoice_id, []).append({"Item": item, "Quantity": quantity, "Price": price})
 
         # Convert past invoices into list of dictionaries
         return [
@@ -77,25 +176,151 @@ class DataAnalysisAgent:
                 "Total_Amount": inv[2],
                 "Tax": inv[3],
                 "Due_Date": inv[4],
-                "Line_Items": json.loads(inv[5])
+                "Line_Items": line_items.get(inv[0], [])
             }
             for inv in past_invoices
         ]
 
     def analyze_invoice(self, invoice_id):
         """Fetches invoice from database and runs validation + fraud detection."""
-        invoice_data = fetch_invoice(invoice_id)
+        invoice_data = fetch_invoice(invoice_id, include_line_items=False)
         if not invoice_data:
             return {"error": "Invoice not found in database."}
 
-        # Fetch all past invoices for comparison
-        past_invoices = self.get_past_invoices(invoice_id)
-
-        validation_results = self.validate_invoice(invoice_data)
-        fraud_results = self.detect_fraud(invoice_data, past_invoices)
+        # Line items are summed in SQL rather than deserialized
+        validation_results = self.validate_invoice(invoice_data, calculated_total=line_items_total(invoice_id))
+        fraud_results = self.detect_fraud(invoice_data)
 
         return {
             "Invoice_ID": invoice_id,
             "Validation": validation_results,
             "Fraud Detection": fraud_results
         }
+
+    def _columns_from_invoices(self, invoices):
+        """Builds the columnar layout used by analyze_batch from invoice dictionaries."""
+        return {
+            "invoice_id": [invoice.get("Invoice_ID") for invoice in invoices],
+            "vendor": [invoice.get("Vendor") for invoice in invoices],
+            "total_amount": [invoice.get("Total_Amount") for invoice in invoices],
+            "tax": [invoice.get("Tax") for invoice in invoices],
+            "due_date": [invoice.get("Due_Date") for invoice in invoices],
+            "line_total": [
+                sum(item["Quantity"] * item["Price"] for item in invoice.get("Line_Items") or [])
+                for invoice in invoices
+            ],
+        }
+
+    def analyze_batch(self, invoices=None):
+        """
+        Validates and fraud-checks many invoices in vectorized passes.
+
+        With no argument the whole stored ledger is re-audited (line items are
+        summed in SQL); otherwise the given invoice dictionaries are checked and
+        duplicates are searched for within that list. Results follow the
+        ``analyze_invoice`` shape, in input order.
+        """
+        columns = load_invoice_columns() if invoices is None else self._columns_from_invoices(invoices)
+        count = len(columns["invoice_id"])
+        if count == 0:
+            return []
+
+        invoice_ids = np.array(columns["invoice_id"], dtype=object)
+        vendors = np.array(columns["vendor"], dtype=object)
+        due_dates = np.array(columns["due_date"], dtype=object)
+        totals = np.array(columns["total_amount"], dtype=float)  # None becomes NaN
+        taxes = np.array(columns["tax"], dtype=float)
+        line_totals = np.array(columns["line_total"], dtype=float)
+
+        # Validation: missing fields
+        missing_id = ~invoice_ids.astype(bool)
+        missing_vendor = ~vendors.astype(bool)
+        missing_total = np.isnan(totals)
+        missing_tax = np.isnan(taxes)
+        missing_due_date = ~due_dates.astype(bool)
+
+        # Validation: line items must add up to the total
+        mismatch = np.abs(line_totals - np.nan_to_num(totals)) > TOTAL_MISMATCH_TOLERANCE
+
+        # Fraud: tax above MAX_TAX_RATIO of the total (missing values never trigger)
+        with np.errstate(invalid="ignore"):
+            high_tax = taxes > MAX_TAX_RATIO * totals
+
+        # Fraud: other invoices sharing (vendor, total, due date)
+        duplicate_counts = self._duplicate_counts(vendors, totals, due_dates, missing_vendor | missing_total | missing_due_date)
+
+        invalid = missing_id | missing_vendor | missing_total | missing_tax | missing_due_date | mismatch
+        flagged = high_tax | (duplicate_counts > 0)
+
+        # Only the (usually few) problem rows need per-row message building
+        errors_by_index = {}
+        for index in np.flatnonzero(invalid).tolist():
+            errors = []
+            if missing_id[index]:
+                errors.append("Missing Invoice ID")
+            if missing_vendor[index]:
+                errors.append("Missing Vendor Name")
+            if missing_total[index]:
+                errors.append("Missing Total Amount")
+            if missing_tax[index]:
+                errors.append("Missing Tax Amount")
+            if missing_due_date[index]:
+                errors.append("Missing Due Date")
+            if mismatch[index]:
+                errors.append(
+                    f"Total Amount Mismatch: Expected {float(line_totals[index])}, "
+                    f"but got {columns['total_amount'][index]}"
+                )
+            errors_by_index[index] = errors
+
+        warnings_by_index = {}
+        for index in np.flatnonzero(flagged).tolist():
+            warnings = ["⚠️ Potential Duplicate Invoice Detected."] * int(duplicate_counts[index])
+            if high_tax[index]:
+                warnings.append("⚠️ Unusually High Tax Rate Detected.")
+            warnings_by_index[index] = warnings
+
+        results = []
+        for index, invoice_id in enumerate(columns["invoice_id"]):
+            errors = errors_by_index.get(index, [])
+            warnings = warnings_by_index.get(index, [])
+            results.append({
+                "Invoice_ID": invoice_id,
+                "Validation": {"valid": not errors, "errors": errors},
+                "Fraud Detection": {"fraud_detected": bool(warnings), "warnings": warnings},
+            })
+        return results
+
+    def _duplicate_counts(self, vendors, totals, due_dates, excluded):
+        """
+        For each invoice, counts the other invoices with the same (vendor, total, due date).
+
+        Each key column is factorized to integer codes, the codes are packed
+        into one int64 key and grouped with a single ``np.unique`` pass. Rows in
+        ``excluded`` (missing key fields) never match anything.
+        """
+        duplicate_counts = np.zeros(len(vendors), dtype=np.int64)
+        candidates = np.flatnonzero(~excluded)
+        if candidates.size == 0:
+            return duplicate_counts
+
+        vendor_codes, vendor_count = _factorize(vendors[candidates])
+        total_codes, total_count = _factorize(totals[candidates])
+        due_date_codes, due_date_count = _factorize(due_dates[candidates])
+
+        if vendor_count * total_count * due_date_count < 2 ** 63:
+            keys = (vendor_codes * total_count + total_codes) * due_date_count + due_date_codes
+            _, group_ids, group_sizes = np.unique(keys, return_inverse=True, return_counts=True)
+        else:
+            keys = np.stack([vendor_codes, total_codes, due_date_codes], axis=1)
+            _, group_ids, group_sizes = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+        duplicate_counts[candidates] = group_sizes[group_ids.ravel()] - 1
+        return duplicate_counts
+
+
+def _factorize(values):
+    """Maps values to dense int64 codes in one hashing pass; returns (codes, number of distinct values)."""
+    lookup = {}
+    codes = np.fromiter((lookup.setdefault(value, len(lookup)) for value in values.tolist()),
+                        dtype=np.int64, count=len(values))
+    return codes, len(lookup)
@@ -1,21 +1,123 @@
-import google.generativeai as genai
+import asyncio
+import functools
 import os
-from dotenv import load_dotenv
+import weakref
 import base64
 import json
-from crewai import Agent
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from components.connections.database import save_invoice, init_db
+from components.connections.extraction_cache import ExtractionCache
+from utilities.image_preprocessing import (
+    prepare_image, sniff_mime_type, file_digest, MAX_IMAGE_DIMENSION, JPEG_QUALITY
+)
+from utilities.pdf_pages import iter_pdf_pages, merge_page_extractions
+from utilities.rate_limiter import AsyncRateLimiter
+from utilities.lazy_imports import lazy_import
 
-# Load API Key
-load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# Heavy SDKs, imported on first use
+crewai = lazy_import("crewai")
+genai = lazy_import("google.generativeai")
+
+MODEL_NAME = "gemini-2.0-flash"
+
+# Async extraction limits (requests per minute of 0 disables rate limiting)
+MAX_CONCURRENT_EXTRACTIONS = int(os.getenv("GEMINI_MAX_CONCURRENCY", 16))
+REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", 0))
+# Pages of one PDF invoice extracted concurrently
+MAX_PAGE_WORKERS = int(os.getenv("PDF_MAX_PAGE_WORKERS", 8))
+
+# Invoices packed into one request by the batched extraction mode
+EXTRACTION_BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", 4))
+
+INVOICE_FORMAT = (
+    "{\n"
+    '  "Invoice_ID": "string",\n'
+    '  "Vendor": "string",\n'
+    '  "Total_Amount": float,\n'
+    '  "Tax": float,\n'
+    '  "Due_Date": "YYYY-MM-DD",\n'
+    '  "Line_Items": [\n'
+    '    {"Item": "string", "Quantity": int, "Price": float}\n'
+    '  ]\n'
+    "}"
+)
+
+EXTRACTION_PROMPT = (
+    "Extract the invoice details from this image and return ONLY a valid Python dictionary.\n"
+    "Ensure the response **does NOT include any extra text, labels, or comments**.\n"
+    "Output should be **only the dictionary**, nothing else.\n"
+    "Example format:\n"
+) + INVOICE_FORMAT
+
+BATCH_PROMPT_HEADER = (
+    "You are given {count} separate invoice images. Each image is preceded by a label 'Invoice index N'.\n"
+    "Extract the details of every invoice and return ONLY a valid JSON array with one object per invoice.\n"
+    "Ensure the response **does NOT include any extra text, labels, or comments**.\n"
+    'Every object must contain an "Index" field with the invoice index and otherwise follow this format:\n'
+)
+
+PAGE_PROMPT_SUFFIX = (
+    "\nThis document is page {page_number} of {page_count} of a single multi-page invoice.\n"
+    "Only list the line items printed on this page, and use null for any field that does not appear on this page."
+)
+PAGE_EXTRACTION_PROMPT = EXTRACTION_PROMPT + PAGE_PROMPT_SUFFIX  # Unformatted, used in cache keys
+
+
+def build_page_prompt(page_number, page_count):
+    """Returns the extraction prompt for one page of a PDF invoice."""
+    return EXTRACTION_PROMPT + PAGE_PROMPT_SUFFIX.format(page_number=page_number, page_count=page_count)
+
+
+def build_batch_prompt(count):
+    """Returns the extraction prompt for a request carrying ``count`` invoice images."""
+    return BATCH_PROMPT_HEADER.format(count=count) + INVOICE_FORMAT
+
+
+@functools.lru_cache(maxsize=None)
+def configure_gemini():
+    """Configures the Gemini SDK with GOOGLE_API_KEY (from the environment or .env), once per process."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+
+@functools.lru_cache(maxsize=None)
+def get_model(model_name=MODEL_NAME):
+    """Returns the process-wide GenerativeModel instance for ``model_name``."""
+    configure_gemini()
+    return genai.GenerativeModel(model_name)
 
-# Configure Gemini API
-genai.configure(api_key=GOOGLE_API_KEY)
 
 class DocumentProcessorAgent:
-    def __init__(self):
-        self.agent = Agent(
+    def __init__(self, use_cache=True, max_concurrency=MAX_CONCURRENT_EXTRACTIONS,
+                 requests_per_minute=REQUESTS_PER_MINUTE, max_image_dimension=MAX_IMAGE_DIMENSION,
+                 jpeg_quality=JPEG_QUALITY, max_page_workers=MAX_PAGE_WORKERS,
+                 batch_size=EXTRACTION_BATCH_SIZE):
+        # Initialize database on startup
+        init_db()
+
+        # Content-hash cache of previous extractions (skips the API for resent scans)
+        self.cache = ExtractionCache() if use_cache else None
+
+        # Async extraction throttling
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = AsyncRateLimiter(requests_per_minute, period=60.0) if requests_per_minute else None
+        self._semaphores = weakref.WeakKeyDictionary()
+
+        # Pre-upload image downscaling
+        self.max_image_dimension = max_image_dimension
+        self.jpeg_quality = jpeg_quality
+
+        # Concurrent page extraction for PDF invoices
+        self.max_page_workers = max_page_workers
+
+        # Images packed into one request by extract_invoice_batch
+        self.batch_size = batch_size
+
+    @functools.cached_property
+    def agent(self):
+        """CrewAI agent, built on first access; extraction itself calls Gemini directly and never needs it."""
+        return crewai.Agent(
             role="Document Processor",
             goal=(
                 "Extract structured information from invoice images "
@@ -32,8 +134,12 @@ class DocumentProcessorAgent:
             )
         )
 
-        # Initialize database on startup
-        init_db()
+    def load_image(self, image_path):
+        """Memory-map, type-sniff and (if large) downscale an image for upload."""
+        try:
+            return prepare_image(image_path, self.max_image_dimension, self.jpeg_quality)
+        except Exception as e:
+            return {"error": f"Failed to load image: {str(e)}"}
 
     def encode_image(self, image_path):
         """Convert image to base64 format for API processing."""
@@ -43,65 +149,387 @@ class DocumentProcessorAgent:
         except Exception as e:
             return {"error": f"Failed to encode image: {str(e)}"}
 
+    def cache_stats(self):
+        """Returns extraction cache hit/miss counters (None when caching is disabled)."""
+        return self.cache.stats() if self.cache else None
+
+    def _build_contents(self, mime_type, data, prompt=EXTRACTION_PROMPT):
+        """Builds the Gemini request contents for one document part."""
+        return [
+            {
+                "role": "user",
+                "parts": [
+                    {"text": prompt},
+                    # Raw bytes: the SDK handles transport encoding, no base64 str copy needed
+                    {"inline_data": {"mime_type": mime_type, "data": data}}
+                ]
+            }
+        ]
+
+    def _lookup_cache(self, digest, prompt=EXTRACTION_PROMPT, preprocessing=None):
+        """Returns (cache_key, cached invoice data or None)."""
+        if not self.cache:
+            return None, None
+        if preprocessing is None:
+            preprocessing = f"{self.max_image_dimension}px/q{self.jpeg_quality}"
+        cache_key = ExtractionCache.make_key(digest, MODEL_NAME, prompt, preprocessing=preprocessing)
+        return cache_key, self.cache.get(cache_key)
+
+    def _parse_response(self, extracted_text):
+        """Parses the model response text into a dictionary (or list for batched requests)."""
+        # FIX: Remove unwanted ```python / ```json fences from the response
+        cleaned_text = extracted_text.strip()
+        if cleaned_text.startswith("```"):
+            cleaned_text = cleaned_text.split("\n", 1)[1] if "\n" in cleaned_text else ""
+            cleaned_text = cleaned_text.rsplit("```", 1)[0].strip()
+
+        # Convert cleaned text to dictionary
+        return json.loads(cleaned_text)
+
+    def _store_invoice(self, invoice_data, cache_key):
+        """Stores an extracted invoice in the database and caches the result."""
+        save_invoice(invoice_data)
+
+        if self.cache:
+            self.cache.put(cache_key, invoice_data)
+
+        return invoice_data  # Return structured invoice data
+
+    def _is_pdf(self, path):
+        try:
+            return sniff_mime_type(path) == "application/pdf"
+        except OSError:
+            return False  # Let the regular loader report the error
+
     def extract_invoice_data(self, image_path):
         """Extract invoice data using Gemini 2.0 Flash API and store it in the database."""
-        image_base64 = self.encode_image(image_path)
-        if isinstance(image_base64, dict) and "error" in image_base64:
-            return image_base64  # Return error if encoding failed
+        if self._is_pdf(image_path):
+            return self.extract_pdf_invoice_data(image_path)
 
-        try:
-            # Initialize the Gemini model
-            model = genai.GenerativeModel("gemini-2.0-flash")
+        image = self.load_image(image_path)
+        if isinstance(image, dict) and "error" in image:
+            return image  # Return error if loading failed
+
+        cache_key, cached_data = self._lookup_cache(image.digest)
+        if cached_data is not None:
+            save_invoice(cached_data)
+            return cached_data
 
+        return self._extract_image(image, cache_key)
+
+    def _extract_image(self, image, cache_key):
+        """Runs one single-image extraction request and stores the result."""
+        try:
             # Call Gemini API with image data
-            response = model.generate_content(
-                contents=[
-                    {
-                        "role": "user",
-                        "parts": [
-                            {"text": (
-                                "Extract the invoice details from this image and return ONLY a valid Python dictionary.\n"
-                                "Ensure the response **does NOT include any extra text, labels, or comments**.\n"
-                                "Output should be **only the dictionary**, nothing else.\n"
-                                "Example format:\n"
-                                "{\n"
-                                '  "Invoice_ID": "string",\n'
-                                '  "Vendor": "string",\n'
-                                '  "Total_Amount": float,\n'
-                                '  "Tax": float,\n'
-                                '  "Due_Date": "YYYY-MM-DD",\n'
-                                '  "Line_Items": [\n'
-                                '    {"Item": "string", "Quantity": int, "Price": float}\n'
-                                '  ]\n'
-                                "}"
-                            )},
-                            {"inline_data": {"mime_type": "image/jpeg", "data": image_base64}}
-                        ]
-                    }
-                ]
-            )
+            response = get_model().generate_content(contents=self._build_contents(image.mime_type, image.data))
+            return self._store_invoice(self._parse_response(response.text), cache_key)
+
+        except json.JSONDecodeError:
+            return {"error": "Failed to parse API response as JSON. Response format may be incorrect."}
+        except Exception as e:
+            return {"error": f"Failed to extract invoice data: {str(e)}"}
+
+    def _build_batch_contents(self, images):
+        """Builds one request containing several labelled invoice images."""
+        parts = [{"text": build_batch_prompt(len(images))}]
+        for index, image in enumerate(images):
+            parts.append({"text": f"Invoice index {index}:"})
+            parts.append({"inline_data": {"mime_type": image.mime_type, "data": image.data}})
+        return [{"role": "user", "parts": parts}]
+
+    def _split_batch_response(self, extracted_text, count):
+        """
+        Maps a batched response to per-index invoice dictionaries.
+
+        Indices that are missing or malformed are absent from the result so
+        the caller can retry them individually.
+        """
+        try:
+            parsed = self._parse_response(extracted_text)
+        except json.JSONDecodeError:
+            return {}
+        if not isinstance(parsed, list):
+            return {}
+
+        results = {}
+        for entry in parsed:
+            if not isinstance(entry, dict) or not entry.get("Invoice_ID"):
+                continue
+            index = entry.pop("Index", None)
+            if isinstance(index, int) and 0 <= index < count and index not in results:
+                results[index] = entry
+        return results
 
-            # Debugging: Print raw response before processing
-            extracted_text = response.text
-            # print("\n🔍 RAW RESPONSE FROM GEMINI API:")
-            # print(extracted_text)
+    def _prepare_batch(self, image_paths):
+        """
+        Loads images and resolves cache hits for a batched extraction.
 
-            # FIX: Remove unwanted ```python and ``` from the response
-            cleaned_text = extracted_text.strip("```python").strip("```").strip()
+        :return: (results, pending, pdfs) where ``results`` holds finished
+                 entries by position, ``pending`` lists (position, image,
+                 cache_key) still needing the model and ``pdfs`` lists
+                 (position, path) of PDFs to process individually.
+        """
+        results = {}
+        pending = []
+        pdfs = []
+        for position, image_path in enumerate(image_paths):
+            if self._is_pdf(image_path):
+                pdfs.append((position, image_path))
+                continue
+            image = self.load_image(image_path)
+            if isinstance(image, dict):
+                results[position] = image
+                continue
+            cache_key, cached_data = self._lookup_cache(image.digest)
+            if cached_data is not None:
+                save_invoice(cached_data)
+                results[position] = cached_data
+            else:
+                pending.append((position, image, cache_key))
+        return results, pending, pdfs
+
+    def _extract_chunk(self, chunk):
+        """Extracts one chunk of images in a single request, falling back to per-image calls."""
+        try:
+            response = get_model().generate_content(contents=self._build_batch_contents([image for _, image, _ in chunk]))
+            extracted = self._split_batch_response(response.text, len(chunk))
+        except Exception:
+            extracted = {}
 
-            # Convert cleaned text to dictionary
-            invoice_data = json.loads(cleaned_text)
+        results = {}
+        for index, (position, image, cache_key) in enumerate(chunk):
+            if index in extracted:
+                try:
+                    results[position] = self._store_invoice(extracted[index], cache_key)
+                    continue
+                except Exception:
+                    pass  # A malformed or partial entry; ask for this image on its own
+            results[position] = self._extract_image(image, cache_key)
+        return results
 
-            # Store extracted invoice data in the database
-            save_invoice(invoice_data)  
+    def extract_invoice_batch(self, image_paths, batch_size=None):
+        """
+        Extract several invoice images, packing up to ``batch_size`` images into each request.
 
-            return invoice_data  # Return structured invoice data
+        Larger batches amortize per-request latency when draining a backlog;
+        invoices missing from a batched response are retried one by one. PDFs
+        are processed individually. Results are returned in input order.
+        """
+        batch_size = max(1, batch_size or self.batch_size)
+        results, pending, pdfs = self._prepare_batch(image_paths)
+        chunks = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            chunk_futures = [pool.submit(self._extract_chunk, chunk) for chunk in chunks]
+            pdf_futures = {pool.submit(self.extract_pdf_invoice_data, path): position for position, path in pdfs}
+            for future in chunk_futures:
+                results.update(future.result())
+            for future, position in pdf_futures.items():
+                results[position] = future.result()
+
+        return [results[position] for position in range(len(image_paths))]
+
+    def _extract_pdf_page(self, page_bytes, page_number, page_count):
+        """Extracts one page of a PDF invoice (not stored on its own)."""
+        try:
+            prompt = build_page_prompt(page_number, page_count)
+            response = get_model().generate_content(contents=self._build_contents("application/pdf", page_bytes, prompt))
+            return self._parse_response(response.text)
+        except json.JSONDecodeError:
+            return {"error": f"Failed to parse API response for page {page_number} as JSON."}
+        except Exception as e:
+            return {"error": f"Failed to extract page {page_number}: {str(e)}"}
+
+    def _merge_pages(self, page_results):
+        """Merges per-page results (keyed by page number) or reports the failed pages."""
+        failed = {number: result for number, result in page_results.items() if "error" in result}
+        if failed:
+            first_error = failed[min(failed)]["error"]
+            return {"error": f"Failed to extract {len(failed)} of {len(page_results)} PDF page(s): {first_error}"}
+        return merge_page_extractions([page_results[number] for number in sorted(page_results)])
+
+    def extract_pdf_invoice_data(self, pdf_path):
+        """
+        Extract a multi-page PDF invoice and store it as one record.
+
+        Pages are sliced lazily and extracted concurrently; at most
+        ``max_page_workers`` pages are held in memory at once. Line items from
+        all pages are merged into a single invoice.
+        """
+        try:
+            digest = file_digest(pdf_path)
+        except Exception as e:
+            return {"error": f"Failed to load PDF: {str(e)}"}
+
+        cache_key, cached_data = self._lookup_cache(digest, PAGE_EXTRACTION_PROMPT, preprocessing="pdf-pages")
+        if cached_data is not None:
+            save_invoice(cached_data)
+            return cached_data
+
+        page_results = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_page_workers) as pool:
+                in_flight = {}
+                for page_number, page_count, page_bytes in iter_pdf_pages(pdf_path):
+                    if len(in_flight) >= self.max_page_workers:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            page_results[in_flight.pop(future)] = future.result()
+                    in_flight[pool.submit(self._extract_pdf_page, page_bytes, page_number, page_count)] = page_number
+
+                for future, page_number in in_flight.items():
+                    page_results[page_number] = future.result()
+        except Exception as e:
+            return {"error": f"Failed to read PDF: {str(e)}"}
+
+        invoice_data = self._merge_pages(page_results)
+        if "error" in invoice_data:
+            return invoice_data
+        return self._store_invoice(invoice_data, cache_key)
+
+    def _get_semaphore(self):
+        """Returns the concurrency semaphore for the running event loop."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def _agenerate(self, contents):
+        """Issues one async model request under the concurrency and rate limits."""
+        async with self._get_semaphore():
+            if self.rate_limiter:
+                await self.rate_limiter.acquire()
+            return await get_model().generate_content_async(contents=contents)
+
+    async def aextract_invoice_data(self, image_path):
+        """
+        Asynchronously extract invoice data and store it in the database.
+
+        Requests are issued with ``generate_content_async`` on the shared model;
+        at most ``max_concurrency`` are in flight and, when configured, the rate
+        limiter spaces out request starts.
+        """
+        if await asyncio.to_thread(self._is_pdf, image_path):
+            return await self.aextract_pdf_invoice_data(image_path)
+
+        image = await asyncio.to_thread(self.load_image, image_path)
+        if isinstance(image, dict) and "error" in image:
+            return image  # Return error if loading failed
+
+        cache_key, cached_data = await asyncio.to_thread(self._lookup_cache, image.digest)
+        if cached_data is not None:
+            await asyncio.to_thread(save_invoice, cached_data)
+            return cached_data
+
+        return await self._aextract_image(image, cache_key)
+
+    async def _aextract_image(self, image, cache_key):
+        """Async counterpart of _extract_image."""
+        try:
+            response = await self._agenerate(self._build_contents(image.mime_type, image.data))
+            return await asyncio.to_thread(self._store_invoice, self._parse_response(response.text), cache_key)
 
         except json.JSONDecodeError:
             return {"error": "Failed to parse API response as JSON. Response format may be incorrect."}
         except Exception as e:
             return {"error": f"Failed to extract invoice data: {str(e)}"}
 
+    async def _aextract_chunk(self, chunk):
+        """Async counterpart of _extract_chunk."""
+        try:
+            response = await self._agenerate(self._build_batch_contents([image for _, image, _ in chunk]))
+            extracted = self._split_batch_response(response.text, len(chunk))
+        except Exception:
+            extracted = {}
+
+        results = {}
+        for index, (position, image, cache_key) in enumerate(chunk):
+            if index in extracted:
+                try:
+                    results[position] = await asyncio.to_thread(self._store_invoice, extracted[index], cache_key)
+                    continue
+                except Exception:
+                    pass  # A malformed or partial entry; ask for this image on its own
+            results[position] = await self._aextract_image(image, cache_key)
+        return results
+
+    async def aextract_invoice_batch(self, image_paths, batch_size=None):
+        """Async counterpart of extract_invoice_batch; chunks are requested concurrently."""
+        batch_size = max(1, batch_size or self.batch_size)
+        results, pending, pdfs = await asyncio.to_thread(self._prepare_batch, image_paths)
+        chunks = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+
+        chunk_results = await asyncio.gather(*(self._aextract_chunk(chunk) for chunk in chunks))
+        pdf_results = await asyncio.gather(*(self.aextract_pdf_invoice_data(path) for _, path in pdfs))
+        for chunk_result in chunk_results:
+            results.update(chunk_result)
+        for (position, _), pdf_result in zip(pdfs, pdf_results):
+            results[position] = pdf_result
+
+        return [results[position] for position in range(len(image_paths))]
+
+    async def _aextract_pdf_page(self, page_bytes, page_number, page_count):
+        try:
+            prompt = build_page_prompt(page_number, page_count)
+            response = await self._agenerate(self._build_contents("application/pdf", page_bytes, prompt))
+            return self._parse_response(response.text)
+        except json.JSONDecodeError:
+            return {"error": f"Failed to parse API response for page {page_number} as JSON."}
+        except Exception as e:
+            return {"error": f"Failed to extract page {page_number}: {str(e)}"}
+
+    async def aextract_pdf_invoice_data(self, pdf_path):
+        """Async counterpart of extract_pdf_invoice_data."""
+        try:
+            digest = await asyncio.to_thread(file_digest, pdf_path)
+        except Exception as e:
+            return {"error": f"Failed to load PDF: {str(e)}"}
+
+        cache_key, cached_data = await asyncio.to_thread(
+            self._lookup_cache, digest, PAGE_EXTRACTION_PROMPT, "pdf-pages"
+        )
+        if cached_data is not None:
+            await asyncio.to_thread(save_invoice, cached_data)
+            return cached_data
+
+        page_results = {}
+        window = asyncio.Semaphore(self.max_page_workers)
+
+        async def extract_page(page_number, page_count, page_bytes):
+            try:
+                page_results[page_number] = await self._aextract_pdf_page(page_bytes, page_number, page_count)
+            finally:
+                window.release()
+
+        try:
+            pages = iter_pdf_pages(pdf_path)
+            tasks = []
+            while True:
+                # Only slice the next page once a slot in the window is free
+                await window.acquire()
+                page = await asyncio.to_thread(next, pages, None)
+                if page is None:
+                    window.release()
+                    break
+                tasks.append(asyncio.create_task(extract_page(*page)))
+            await asyncio.gather(*tasks)
+        except Exception as e:
+            return {"error": f"Failed to read PDF: {str(e)}"}
+
+        invoice_data = self._merge_pages(page_results)
+        if "error" in invoice_data:
+            return invoice_data
+        return await asyncio.to_thread(self._store_invoice, invoice_data, cache_key)
+
     def process_invoice(self, image_path):
-        """Main function to process invoice and return JSON."""
+        """Main function to process invoice (image or PDF) and return JSON."""
         return self.extract_invoice_data(image_path)
+
+    async def aprocess_invoice(self, image_path):
+        """Async counterpart of process_invoice."""
+        return await self.aextract_invoice_data(image_path)
+
+    async def aprocess_invoices(self, image_paths):
+        """Extracts several invoices concurrently, returning results in input order."""
+        return await asyncio.gather(*(self.aextract_invoice_data(image_path) for image_path in image_paths))
@@ -1,10 +1,28 @@
-import sqlite3
-from crewai import Agent
-from components.connections.database import fetch_invoice, DB_PATH
+import functools
+from components.connections.database import existing_invoice_ids, transaction
+from components.connections.erp import ERPClient
+from components.connections.payments import PaymentScheduler
+from utilities.lazy_imports import lazy_import
+
+crewai = lazy_import("crewai")
+
+STATUS_UPDATE_SQL = "UPDATE invoices SET status = ? WHERE invoice_id = ?"
 
 class TaskExecutionAgent:
-    def __init__(self):
-        self.agent = Agent(
+    def __init__(self, erp_client=None, payment_scheduler=None):
+        self.erp = erp_client or ERPClient()
+        if payment_scheduler is not None:
+            self.payments = payment_scheduler
+
+    @functools.cached_property
+    def payments(self):
+        """Payment scheduler, created (and its due-date heap loaded) when the first payment is scheduled."""
+        return PaymentScheduler()
+
+    @functools.cached_property
+    def agent(self):
+        """Lazily built CrewAI agent; status updates, ERP syncs and payments run without it."""
+        return crewai.Agent(
             role="Task Execution Agent",
             goal="Update the ERP system, flag fraudulent invoices, and trigger payment processing.",
             backstory=(
@@ -15,29 +33,102 @@ class TaskExecutionAgent:
         )
 
     def update_invoice_status(self, invoice_id, status):
-        """Updates the invoice status in the database."""
-        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-        cursor = conn.cursor()
+        """Updates the invoice status in the database; returns False if the invoice does not exist."""
+        with transaction() as conn:
+            return conn.execute(STATUS_UPDATE_SQL, (status, invoice_id)).rowcount == 1
 
-        cursor.execute("UPDATE invoices SET status = ? WHERE invoice_id = ?", (status, invoice_id))
-        conn.commit()
-        conn.close()
+    def update_invoice_statuses(self, updates):
+        """
+        Applies many status changes with one ``executemany`` in a single transaction.
+
+        :param updates: List of (invoice_id, status) tuples.
+        :return: Set of the invoice IDs that exist (and were updated).
+        """
+        with transaction() as conn:
+            existing = existing_invoice_ids(conn, [invoice_id for invoice_id, _ in updates])
+            conn.executemany(
+                STATUS_UPDATE_SQL,
+                ((status, invoice_id) for invoice_id, status in updates if invoice_id in existing),
+            )
+        return existing
 
     def process_invoice(self, invoice_id, fraud_detected):
         """Handles final processing of the invoice."""
-        invoice_data = fetch_invoice(invoice_id)
-        if not invoice_data:
+        # The UPDATE's row count doubles as the existence check
+        if not self.update_invoice_status(invoice_id, "Flagged" if fraud_detected else "Approved"):
             print(f"⚠️ Error: Invoice {invoice_id} not found.")
             return
 
         if fraud_detected:
             print(f"🚨 Fraud detected! Flagging Invoice {invoice_id} as 'Flagged'.")
-            self.update_invoice_status(invoice_id, "Flagged")
             return
 
-        # Simulate ERP update
         print(f"✅ Updating ERP System for Invoice {invoice_id}...")
-        self.update_invoice_status(invoice_id, "Approved")
+        self.erp.sync_invoices([{"invoice_id": invoice_id, "status": "Approved"}])
 
-        # Simulate payment trigger
+        self.payments.schedule([invoice_id])
         print(f"💰 Payment for Invoice {invoice_id} has been scheduled.")
+        self.release_due_payments()
+
+    def process_invoices(self, decisions):
+        """
+        Batch counterpart of process_invoice.
+
+        Statuses are written in one transaction and approved invoices are
+        synced to the ERP in bulk payloads.
+
+        :param decisions: Iterable of (invoice_id, fraud_detected) pairs.
+        :return: {"approved": [...], "flagged": [...], "missing": [...]} invoice IDs.
+        """
+        updates = [(invoice_id, "Flagged" if fraud_detected else "Approved") for invoice_id, fraud_detected in decisions]
+        if not updates:
+            return {"approved": [], "flagged": [], "missing": []}
+        existing = self.update_invoice_statuses(updates)
+
+        results = {"approved": [], "flagged": [], "missing": []}
+        for invoice_id, status in updates:
+            if invoice_id not in existing:
+                results["missing"].append(invoice_id)
+            else:
+                results["approved" if status == "Approved" else "flagged"].append(invoice_id)
+
+        for invoice_id in results["missing"]:
+            print(f"⚠️ Error: Invoice {invoice_id} not found.")
+        if results["flagged"]:
+            print(f"🚨 Fraud detected! Flagging {len(results['flagged'])} invoice(s) as 'Flagged'.")
+        if results["approved"]:
+            print(f"✅ Updating ERP System for {len(results['approved'])} invoice(s)...")
+            self.erp.sync_invoices([{"invoice_id": invoice_id, "status": "Approved"} for invoice_id in results["approved"]])
+            self.payments.schedule(results["approved"])
+            print(f"💰 Payment for {len(results['approved'])} invoice(s) has been scheduled.")
+            self.release_due_payments()
+        return results
+
+    def release_due_payments(self, today=None):
+        """
+        Releases the scheduled payments that fell due, one ERP payload per batch.
+
+        A batch is only kept released once the ERP accepted its "Paid"
+        update; if the sync fails the failure is reported, not raised, and the
+        remaining payments stay scheduled for the next release.
+
+        :return: Number of payments released.
+        """
+        released = 0
+
+        def send(batch):
+            nonlocal released
+            total = sum(payment["amount"] or 0 for payment in batch)
+            print(f"💸 Releasing {len(batch)} payment(s) totalling ${total:,.2f}...")
+            self.erp.sync_invoices([{"invoice_id": payment["invoice_id"], "status": "Paid"} for payment in batch])
+            released += len(batch)
+
+        try:
+            self.payments.release_due(today, send=send)
+        except Exception as e:
+            print(f"⚠️ Failed to release due payments: {str(e)}. They stay scheduled for the next release.")
+        return released
+
+    def upcoming_payments(self, days=7):
+        """Lists scheduled payments due within the next ``days`` days."""
+        return self.payments.due_within(days)
@@ -7,13 +7,14 @@ from core.connection import Connection
 
 
 # Dictionary to hold registered connections
-CONNECTIONS: Dict[str, Connection] = {}
+CONNECTIONS: Dict[str, Connection]  # Populated on first access, see __getattr__
 
 def load_connections():
     """
     Dynamically finds and registers all predefined Connection instances.
     """
     package_name = __name__
+    registry = {}
 
     for _, module_name, _ in pkgutil.iter_modules(__path__):
         module = importlib.import_module(f"{package_name}.{module_name}")
@@ -24,7 +25,14 @@ def load_connections():
             if isinstance(attr, Connection):
                 if not attr.name:  
                     attr.name = module_name  # Assign module name as default name if missing
-                CONNECTIONS[attr.name.lower().replace(" ", "_")] = attr  # Normalize name
+                registry[attr.name.lower().replace(" ", "_")] = attr  # Normalize name
 
-# Load connections when the package is imported
-load_connections()
\ No newline at end of file
+    globals()["CONNECTIONS"] = registry
+    return registry
+
+
+def __getattr__(name):
+    """Builds ``CONNECTIONS`` on first access, so importing e.g. the database module stays cheap."""
+    if name == "CONNECTIONS":
+        return load_connections()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,81 +1,693 @@
 import sqlite3
-import json
 import os
+import queue
+import threading
+import atexit
+from contextlib import contextmanager
+from utilities.near_duplicates import due_day, fingerprint, fingerprints, is_near_duplicate, DATE_WINDOW_DAYS
+from utilities.running_stats import welford_add, welford_remove
 
 # Define database path
-DB_PATH = "src/python_agent_framework/invoices.db"
+DB_PATH = os.getenv("INVOICE_DB_PATH", "src/python_agent_framework/invoices.db")
 
+# Pragmas applied to every pooled connection
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",      # Readers no longer block the writer
+    "PRAGMA synchronous = NORMAL",    # fsync on checkpoint instead of every commit (safe with WAL)
+    "PRAGMA busy_timeout = 5000",     # Wait for locks instead of raising "database is locked"
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",     # ~16 MB page cache per connection
+    "PRAGMA foreign_keys = ON",
+)
 
 
+class ConnectionPool:
+    """
+    Thread-safe pool of long-lived SQLite connections.
 
-def init_db():
-    """Initialize the SQLite database for storing invoices."""
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)  # Allows multiple agents to access DB
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS invoices (
-            invoice_id TEXT PRIMARY KEY,
-            vendor TEXT,
-            total_amount REAL,
-            tax REAL,
-            due_date TEXT,
-            line_items TEXT,  -- JSON String
-            status TEXT  -- "Pending", "Flagged", "Approved"
+    Connections are opened lazily up to ``max_size``, configured once with
+    ``PRAGMAS`` and reused across calls, so each one keeps its page cache and
+    its prepared-statement cache (``cached_statements``) warm.
+    """
+
+    def __init__(self, db_path, max_size=8, timeout=30.0, cached_statements=256):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,  # Connections move between threads through the pool
+            isolation_level=None,     # Transactions are managed explicitly by transaction()
+            cached_statements=self.cached_statements,
         )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        """Returns an idle connection, opening a new one if the pool is not full."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._connections) < self.max_size:
+                conn = self._connect()
+                self._connections.append(conn)
+                return conn
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No SQLite connection available for '{self.db_path}' after {self.timeout}s.")
+
+    def release(self, conn):
+        """Returns a connection to the pool, rolling back any unfinished transaction."""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrows a connection for the duration of the ``with`` block."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Borrows a connection and wraps the block in a write transaction.
+
+        ``BEGIN IMMEDIATE`` takes the write lock up front so concurrent writers
+        queue on ``busy_timeout`` instead of failing on a lock upgrade.
+        """
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def close(self):
+        """Closes every connection opened by the pool."""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+            self._idle = queue.LifoQueue()
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+_INHERITED_POOLS = []  # Pools copied from the parent process by fork()
+
+
+def get_pool(db_path=None):
+    """Returns the shared connection pool for ``db_path`` (defaults to DB_PATH)."""
+    db_path = db_path or DB_PATH
+    with _POOLS_LOCK:
+        pool = _POOLS.get(db_path)
+        if pool is None:
+            pool = _POOLS[db_path] = ConnectionPool(db_path)
+        return pool
+
+
+def get_connection(db_path=None):
+    """Context manager borrowing a pooled connection for reads."""
+    return get_pool(db_path).connection()
+
+
+def transaction(db_path=None):
+    """Context manager borrowing a pooled connection inside a write transaction."""
+    return get_pool(db_path).transaction()
+
+
+def _forget_pools_after_fork():
+    """
+    Drops the parent's pools in a forked child.
+
+    SQLite connections must not be used across processes, so the child
+    opens its own. The inherited ones are kept referenced and never closed:
+    closing them in the child could checkpoint or delete the parent's WAL.
+    """
+    global _POOLS_LOCK
+    _POOLS_LOCK = threading.Lock()
+    _INHERITED_POOLS.extend(_POOLS.values())
+    _POOLS.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_pools_after_fork)
+
+
+@atexit.register
+def close_pools():
+    """Closes all pooled connections (checkpoints the WAL on exit)."""
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.close()
+        _POOLS.clear()
+
+
+# Databases whose schema init_db() already created or migrated in this process
+_INITIALIZED_DBS = set()
+
+
+def init_db():
+    """
+    Initialize the SQLite database for storing invoices.
+
+    Runs once per process and database file; later calls (e.g. from every
+    agent constructed in a worker) return immediately.
+    """
+    if DB_PATH in _INITIALIZED_DBS and os.path.exists(DB_PATH):
+        return
+
+    with transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS invoices (
+                invoice_id TEXT PRIMARY KEY,
+                vendor TEXT,
+                total_amount REAL,
+                tax REAL,
+                due_date TEXT,
+                status TEXT  -- "Pending", "Flagged", "Approved"
+            )
+        """)
+        # Duplicate detection looks invoices up by (vendor, total_amount, due_date)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_invoices_duplicate_key
+            ON invoices (vendor, total_amount, due_date)
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS invoice_line_items (
+                invoice_id TEXT NOT NULL REFERENCES invoices (invoice_id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,  -- Order of the item on the invoice
+                item TEXT,
+                quantity NUMERIC,
+                price REAL,
+                PRIMARY KEY (invoice_id, position)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_line_items_item ON invoice_line_items (item)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_line_items_price ON invoice_line_items (price)")
+
+        # Near-duplicate candidates are looked up by neighbouring amount buckets and due dates
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS invoice_fingerprints (
+                invoice_id TEXT PRIMARY KEY REFERENCES invoices (invoice_id) ON DELETE CASCADE,
+                amount_bucket INTEGER,
+                due_day INTEGER,  -- Due date as a day ordinal
+                signature TEXT    -- Comma-separated MinHash of the line item descriptions
+            )
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_fingerprints_neighbourhood
+            ON invoice_fingerprints (amount_bucket, due_day)
+        """)
+
+        # Running per-vendor statistics, updated on every insert (Welford count/mean/M2)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS vendor_stats (
+                vendor TEXT PRIMARY KEY,
+                total_count INTEGER NOT NULL DEFAULT 0,
+                total_mean REAL NOT NULL DEFAULT 0,
+                total_m2 REAL NOT NULL DEFAULT 0,
+                tax_ratio_count INTEGER NOT NULL DEFAULT 0,
+                tax_ratio_mean REAL NOT NULL DEFAULT 0,
+                tax_ratio_m2 REAL NOT NULL DEFAULT 0,
+                gap_count INTEGER NOT NULL DEFAULT 0,  -- Days between consecutive due dates
+                gap_mean REAL NOT NULL DEFAULT 0,
+                gap_m2 REAL NOT NULL DEFAULT 0,
+                last_due_day INTEGER,
+                last_invoice_id TEXT,     -- Invoice that set last_due_day
+                previous_due_day INTEGER  -- last_due_day before that invoice
+            )
+        """)
+
+        migrate_line_items(conn)
+        migrate_fingerprints(conn)
+        migrate_vendor_stats(conn)
+    _INITIALIZED_DBS.add(DB_PATH)
+
+def migrate_line_items(conn):
+    """
+    Moves line items out of the legacy ``invoices.line_items`` JSON column.
+
+    Databases created before the ``invoice_line_items`` table existed keep
+    their items as a JSON string per invoice. They are copied into the
+    normalized table with SQLite's JSON functions and the old column is
+    dropped (or cleared on SQLite versions without DROP COLUMN).
+    """
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(invoices)")]
+    if "line_items" not in columns:
+        return
+
+    conn.execute("""
+        INSERT OR IGNORE INTO invoice_line_items (invoice_id, position, item, quantity, price)
+        SELECT invoices.invoice_id, items.key,
+               json_extract(items.value, '$.Item'),
+               json_extract(items.value, '$.Quantity'),
+               json_extract(items.value, '$.Price')
+        FROM invoices, json_each(invoices.line_items) AS items
+        WHERE invoices.line_items IS NOT NULL AND json_valid(invoices.line_items)
     """)
-    conn.commit()
-    conn.close()
+    try:
+        conn.execute("ALTER TABLE invoices DROP COLUMN line_items")
+    except sqlite3.OperationalError:  # SQLite < 3.35
+        conn.execute("UPDATE invoices SET line_items = NULL")
 
-def save_invoice(invoice_data):
-    """Save extracted invoice data into the database, avoiding duplicates."""
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    cursor = conn.cursor()
+def migrate_fingerprints(conn):
+    """
+    Fingerprints invoices stored before ``invoice_fingerprints`` existed.
 
-    # Check if invoice already exists
-    cursor.execute("SELECT invoice_id FROM invoices WHERE invoice_id = ?", (invoice_data["Invoice_ID"],))
-    existing_invoice = cursor.fetchone()
+    Runs once per database; completion is recorded in ``PRAGMA user_version``.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+        return
 
-    if existing_invoice:
-        print(f"⚠️ Warning: Invoice {invoice_data['Invoice_ID']} already exists in the database. Skipping insertion.")
-        conn.close()
-        return  # Exit without inserting duplicate invoice
+    invoices = {
+        invoice_id: {"Invoice_ID": invoice_id, "Total_Amount": total_amount, "Due_Date": due_date, "Line_Items": []}
+        for invoice_id, total_amount, due_date in conn.execute("""
+            SELECT invoice_id, total_amount, due_date FROM invoices
+            WHERE invoice_id NOT IN (SELECT invoice_id FROM invoice_fingerprints)
+        """)
+    }
+    for invoice_id, item in conn.execute("SELECT invoice_id, item FROM invoice_line_items"):
+        if invoice_id in invoices:
+            invoices[invoice_id]["Line_Items"].append({"Item": item})
+    conn.executemany(INSERT_FINGERPRINT_SQL, _fingerprint_rows(list(invoices.values())))
+    conn.execute("PRAGMA user_version = 1")
+
+def migrate_vendor_stats(conn):
+    """Builds ``vendor_stats`` from invoices stored before it existed (user_version 2)."""
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= 2:
+        return
+
+    conn.execute("DELETE FROM vendor_stats")
+    invoices = (
+        {"Invoice_ID": invoice_id, "Vendor": vendor, "Total_Amount": total_amount, "Tax": tax, "Due_Date": due_date}
+        for invoice_id, vendor, total_amount, tax, due_date in conn.execute(
+            "SELECT invoice_id, vendor, total_amount, tax, due_date FROM invoices WHERE vendor IS NOT NULL"
+        )
+    )
+    _update_vendor_stats(conn, list(invoices))
+    conn.execute("PRAGMA user_version = 2")
+
+INSERT_INVOICE_SQL = """
+    INSERT INTO invoices (invoice_id, vendor, total_amount, tax, due_date, status)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (invoice_id) DO NOTHING
+"""
 
-    cursor.execute("""
-        INSERT INTO invoices (invoice_id, vendor, total_amount, tax, due_date, line_items, status)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (
+INSERT_LINE_ITEM_SQL = """
+    INSERT INTO invoice_line_items (invoice_id, position, item, quantity, price)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+INSERT_FINGERPRINT_SQL = """
+    INSERT OR REPLACE INTO invoice_fingerprints (invoice_id, amount_bucket, due_day, signature)
+    VALUES (?, ?, ?, ?)
+"""
+
+# Rows written per transaction by save_invoices
+BULK_CHUNK_SIZE = 5000
+
+# Bound parameters per "IN (...)" lookup (stays below SQLite's variable limit)
+LOOKUP_BATCH_SIZE = 500
+
+
+def _invoice_row(invoice_data):
+    """Converts an invoice dictionary into an ``invoices`` row."""
+    return (
         invoice_data["Invoice_ID"],
         invoice_data["Vendor"],
         invoice_data["Total_Amount"],
         invoice_data["Tax"],
         invoice_data["Due_Date"],
-        json.dumps(invoice_data["Line_Items"]),  # Convert list to JSON string
         "Pending"
-    ))
-
-    conn.commit()
-    conn.close()
-
-def fetch_invoice(invoice_id):
-    """Retrieve an invoice from the database using invoice_id."""
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM invoices WHERE invoice_id = ?", (invoice_id,))
-    invoice = cursor.fetchone()
-    
-    conn.close()
-    
-    if invoice:
-        return {
+    )
+
+def _line_item_rows(invoice_data):
+    """Converts an invoice's line items into ``invoice_line_items`` rows."""
+    return [
+        (invoice_data["Invoice_ID"], position, item.get("Item"), item.get("Quantity"), item.get("Price"))
+        for position, item in enumerate(invoice_data.get("Line_Items") or [])
+    ]
+
+def _fingerprint_row(invoice_data, features=None):
+    """Converts an invoice (and its precomputed ``fingerprint``, if given) into its ``invoice_fingerprints`` row."""
+    features = features or fingerprint(invoice_data)
+    signature = features["signature"]
+    return (
+        invoice_data["Invoice_ID"],
+        features["amount_bucket"],
+        features["due_day"],
+        ",".join(map(str, signature)) if signature else None,
+    )
+
+def _fingerprint_rows(invoices):
+    """``invoice_fingerprints`` rows for many invoices, MinHashed in one vectorized pass."""
+    return list(map(_fingerprint_row, invoices, fingerprints(invoices)))
+
+VENDOR_STATS_COLUMNS = (
+    "vendor", "total_count", "total_mean", "total_m2", "tax_ratio_count", "tax_ratio_mean", "tax_ratio_m2",
+    "gap_count", "gap_mean", "gap_m2", "last_due_day", "last_invoice_id", "previous_due_day",
+)
+
+UPSERT_VENDOR_STATS_SQL = f"""
+    INSERT OR REPLACE INTO vendor_stats ({", ".join(VENDOR_STATS_COLUMNS)})
+    VALUES ({", ".join("?" * len(VENDOR_STATS_COLUMNS))})
+"""
+
+def _empty_vendor_stats(vendor):
+    stats = dict.fromkeys(VENDOR_STATS_COLUMNS, 0)
+    stats.update(vendor=vendor, last_due_day=None, last_invoice_id=None, previous_due_day=None)
+    return stats
+
+def _load_vendor_stats(conn, vendors):
+    """Returns {vendor: stats dict} for the vendors that already have statistics."""
+    stats = {}
+    for start in range(0, len(vendors), LOOKUP_BATCH_SIZE):
+        batch = vendors[start:start + LOOKUP_BATCH_SIZE]
+        placeholders = ", ".join("?" * len(batch))
+        for row in conn.execute(
+            f"SELECT {', '.join(VENDOR_STATS_COLUMNS)} FROM vendor_stats WHERE vendor IN ({placeholders})", batch
+        ):
+            stats[row[0]] = dict(zip(VENDOR_STATS_COLUMNS, row))
+    return stats
+
+def _tax_ratio(invoice_data):
+    total_amount, tax = invoice_data.get("Total_Amount"), invoice_data.get("Tax")
+    if not total_amount or tax is None:
+        return None
+    return tax / total_amount
+
+def _add_to_vendor_stats(stats, invoice_data):
+    """Folds one invoice into a vendor's running statistics (O(1))."""
+    if invoice_data.get("Total_Amount") is not None:
+        stats["total_count"], stats["total_mean"], stats["total_m2"] = welford_add(
+            stats["total_count"], stats["total_mean"], stats["total_m2"], invoice_data["Total_Amount"]
+        )
+    tax_ratio = _tax_ratio(invoice_data)
+    if tax_ratio is not None:
+        stats["tax_ratio_count"], stats["tax_ratio_mean"], stats["tax_ratio_m2"] = welford_add(
+            stats["tax_ratio_count"], stats["tax_ratio_mean"], stats["tax_ratio_m2"], tax_ratio
+        )
+
+    # Cadence only advances with later due dates; back-dated invoices leave it unchanged
+    day = due_day(invoice_data.get("Due_Date"))
+    if day is not None and (stats["last_due_day"] is None or day > stats["last_due_day"]):
+        if stats["last_due_day"] is not None:
+            stats["gap_count"], stats["gap_mean"], stats["gap_m2"] = welford_add(
+                stats["gap_count"], stats["gap_mean"], stats["gap_m2"], day - stats["last_due_day"]
+            )
+        stats["previous_due_day"] = stats["last_due_day"]
+        stats["last_due_day"] = day
+        stats["last_invoice_id"] = invoice_data["Invoice_ID"]
+
+def _update_vendor_stats(conn, invoices):
+    """Updates ``vendor_stats`` for newly inserted invoices (one read and one write per vendor)."""
+    invoices = [invoice_data for invoice_data in invoices if invoice_data.get("Vendor")]
+    if not invoices:
+        return
+    stats = _load_vendor_stats(conn, list({invoice_data["Vendor"] for invoice_data in invoices}))
+    for invoice_data in sorted(invoices, key=lambda invoice_data: due_day(invoice_data.get("Due_Date")) or 0):
+        vendor = invoice_data["Vendor"]
+        if vendor not in stats:
+            stats[vendor] = _empty_vendor_stats(vendor)
+        _add_to_vendor_stats(stats[vendor], invoice_data)
+    conn.executemany(
+        UPSERT_VENDOR_STATS_SQL,
+        ([vendor_stats[column] for column in VENDOR_STATS_COLUMNS] for vendor_stats in stats.values()),
+    )
+
+def save_invoice(invoice_data):
+    """Save extracted invoice data into the database, avoiding duplicates."""
+    with transaction() as conn:
+        inserted = conn.execute(INSERT_INVOICE_SQL, _invoice_row(invoice_data)).rowcount == 1
+        if inserted:
+            conn.executemany(INSERT_LINE_ITEM_SQL, _line_item_rows(invoice_data))
+            conn.execute(INSERT_FINGERPRINT_SQL, _fingerprint_row(invoice_data))
+            _update_vendor_stats(conn, [invoice_data])
+
+    if not inserted:
+        print(f"⚠️ Warning: Invoice {invoice_data['Invoice_ID']} already exists in the database. Skipping insertion.")
+    return inserted
+
+def existing_invoice_ids(conn, invoice_ids):
+    """Returns which of ``invoice_ids`` are already stored (batched primary-key lookups on ``conn``)."""
+    existing = set()
+    for start in range(0, len(invoice_ids), LOOKUP_BATCH_SIZE):
+        batch = invoice_ids[start:start + LOOKUP_BATCH_SIZE]
+        placeholders = ", ".join("?" * len(batch))
+        existing.update(
+            row[0] for row in conn.execute(
+                f"SELECT invoice_id FROM invoices WHERE invoice_id IN ({placeholders})", batch
+            )
+        )
+    return existing
+
+def save_invoices(invoices, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Bulk-insert invoices, skipping any whose invoice_id already exists.
+
+    Rows are written with ``executemany`` in one transaction per chunk of
+    ``chunk_size`` invoices. Nothing is printed for duplicates.
+
+    :param invoices: Iterable of invoice dictionaries (consumed lazily).
+    :return: {"inserted": int, "skipped": int}
+    """
+    counts = {"inserted": 0, "skipped": 0}
+    chunk = []
+
+    def flush():
+        # Fingerprinting is the costliest step; do it before taking the write lock
+        fingerprint_rows = _fingerprint_rows(chunk)
+        with transaction() as conn:
+            # Filter duplicates up front so line items are only written for new invoices
+            seen = existing_invoice_ids(conn, [invoice_data["Invoice_ID"] for invoice_data in chunk])
+            new_invoices, new_fingerprint_rows = [], []
+            for invoice_data, fingerprint_row in zip(chunk, fingerprint_rows):
+                if invoice_data["Invoice_ID"] not in seen:
+                    seen.add(invoice_data["Invoice_ID"])
+                    new_invoices.append(invoice_data)
+                    new_fingerprint_rows.append(fingerprint_row)
+
+            conn.executemany(INSERT_INVOICE_SQL, map(_invoice_row, new_invoices))
+            conn.executemany(
+                INSERT_LINE_ITEM_SQL,
+                (row for invoice_data in new_invoices for row in _line_item_rows(invoice_data)),
+            )
+            conn.executemany(INSERT_FINGERPRINT_SQL, new_fingerprint_rows)
+            _update_vendor_stats(conn, new_invoices)
+        counts["inserted"] += len(new_invoices)
+        counts["skipped"] += len(chunk) - len(new_invoices)
+        chunk.clear()
+
+    for invoice_data in invoices:
+        chunk.append(invoice_data)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    return counts
+
+def fetch_line_items(invoice_id, conn=None):
+    """Retrieve an invoice's line items in their original order."""
+    if conn is None:
+        with get_connection() as conn:
+            return fetch_line_items(invoice_id, conn)
+
+    rows = conn.execute(
+        "SELECT item, quantity, price FROM invoice_line_items WHERE invoice_id = ? ORDER BY position",
+        (invoice_id,),
+    ).fetchall()
+    return [{"Item": item, "Quantity": quantity, "Price": price} for item, quantity, price in rows]
+
+def fetch_invoice(invoice_id, include_line_items=True):
+    """
+    Retrieve an invoice from the database using invoice_id.
+
+    Line items are only joined in when ``include_line_items`` is True.
+    """
+    with get_connection() as conn:
+        invoice = conn.execute("""
+            SELECT invoice_id, vendor, total_amount, tax, due_date, status
+            FROM invoices WHERE invoice_id = ?
+        """, (invoice_id,)).fetchone()
+
+        if not invoice:
+            return None
+
+        invoice_data = {
             "Invoice_ID": invoice[0],
             "Vendor": invoice[1],
             "Total_Amount": invoice[2],
             "Tax": invoice[3],
             "Due_Date": invoice[4],
-            "Line_Items": json.loads(invoice[5]),
-            "Status": invoice[6]
         }
-    else:
+        if include_line_items:
+            invoice_data["Line_Items"] = fetch_line_items(invoice_id, conn)
+        invoice_data["Status"] = invoice[5]
+        return invoice_data
+
+def line_items_total(invoice_id):
+    """Returns SUM(quantity * price) over an invoice's line items."""
+    with get_connection() as conn:
+        return conn.execute(
+            "SELECT COALESCE(SUM(quantity * price), 0) FROM invoice_line_items WHERE invoice_id = ?",
+            (invoice_id,),
+        ).fetchone()[0]
+
+INVOICE_COLUMNS = ("invoice_id", "vendor", "total_amount", "tax", "due_date", "line_total")
+
+def load_invoice_columns():
+    """
+    Loads the whole ledger column-wise for batch analysis.
+
+    Line items are reduced to one ``line_total`` per invoice inside SQLite.
+
+    :return: Dict mapping each name in INVOICE_COLUMNS to a tuple of values.
+    """
+    with get_connection() as conn:
+        rows = conn.execute("""
+            SELECT inv.invoice_id, inv.vendor, inv.total_amount, inv.tax, inv.due_date,
+                   COALESCE(li.line_total, 0)
+            FROM invoices AS inv
+            LEFT JOIN (
+                SELECT invoice_id, SUM(quantity * price) AS line_total
+                FROM invoice_line_items GROUP BY invoice_id
+            ) AS li ON li.invoice_id = inv.invoice_id
+        """).fetchall()
+
+    columns = list(zip(*rows)) if rows else [()] * len(INVOICE_COLUMNS)
+    return dict(zip(INVOICE_COLUMNS, columns))
+
+def spend_by_item(vendor=None, limit=20):
+    """Returns the items with the highest total spend, optionally for one vendor."""
+    with get_connection() as conn:
+        rows = conn.execute("""
+            SELECT li.item, SUM(li.quantity) AS quantity, SUM(li.quantity * li.price) AS spend
+            FROM invoice_line_items AS li
+            JOIN invoices AS inv ON inv.invoice_id = li.invoice_id
+            WHERE ? IS NULL OR inv.vendor = ?
+            GROUP BY li.item
+            ORDER BY spend DESC
+            LIMIT ?
+        """, (vendor, vendor, limit)).fetchall()
+    return [{"Item": item, "Quantity": quantity, "Spend": spend} for item, quantity, spend in rows]
+
+def find_duplicate_invoices(vendor, total_amount, due_date, exclude_invoice_id=None):
+    """Returns the IDs of stored invoices sharing vendor, total amount and due date (index lookup)."""
+    with get_connection() as conn:
+        rows = conn.execute("""
+            SELECT invoice_id FROM invoices
+            WHERE vendor = ? AND total_amount = ? AND due_date = ? AND invoice_id IS NOT ?
+        """, (vendor, total_amount, due_date, exclude_invoice_id)).fetchall()
+    return [row[0] for row in rows]
+
+def fetch_vendor_baseline(invoice_data):
+    """
+    Returns the running statistics of the invoice's vendor, excluding the invoice itself.
+
+    A stored invoice has already been folded into its vendor's statistics; its
+    contribution is subtracted again (inverse Welford update) so it is judged
+    against the vendor's other invoices only. Returns None for unknown vendors.
+    """
+    vendor = invoice_data.get("Vendor")
+    if not vendor:
         return None
 
+    with get_connection() as conn:
+        stats = _load_vendor_stats(conn, [vendor]).get(vendor)
+        if stats is None:
+            return None
+        stored = conn.execute(
+            "SELECT 1 FROM invoices WHERE invoice_id = ? AND vendor = ?", (invoice_data.get("Invoice_ID"), vendor)
+        ).fetchone()
+
+    if stored:
+        if invoice_data.get("Total_Amount") is not None:
+            stats["total_count"], stats["total_mean"], stats["total_m2"] = welford_remove(
+                stats["total_count"], stats["total_mean"], stats["total_m2"], invoice_data["Total_Amount"]
+            )
+        tax_ratio = _tax_ratio(invoice_data)
+        if tax_ratio is not None:
+            stats["tax_ratio_count"], stats["tax_ratio_mean"], stats["tax_ratio_m2"] = welford_remove(
+                stats["tax_ratio_count"], stats["tax_ratio_mean"], stats["tax_ratio_m2"], tax_ratio
+            )
+        if stats["last_invoice_id"] == invoice_data.get("Invoice_ID"):
+            if stats["previous_due_day"] is not None:
+                stats["gap_count"], stats["gap_mean"], stats["gap_m2"] = welford_remove(
+                    stats["gap_count"], stats["gap_mean"], stats["gap_m2"],
+                    stats["last_due_day"] - stats["previous_due_day"]
+                )
+            stats["last_due_day"] = stats["previous_due_day"]
+    return stats
+
+def find_near_duplicates(invoice_data, exclude_invoice_id=None):
+    """
+    Returns the IDs of stored invoices that look like re-submissions of ``invoice_data``.
+
+    Candidates come from an index range scan over neighbouring amount buckets
+    and due dates, so the cost does not grow with the ledger. Exact duplicates
+    (same vendor, total and due date) are left to ``find_duplicate_invoices``.
+    If ``invoice_data`` has no "Line_Items", the stored fingerprint of
+    ``exclude_invoice_id`` supplies the line item signature.
+    """
+    features = fingerprint(invoice_data)
+    bucket, day = features["amount_bucket"], features["due_day"]
+    if bucket is None or day is None:
+        return []
+
+    with get_connection() as conn:
+        if "Line_Items" not in invoice_data and exclude_invoice_id is not None:
+            row = conn.execute(
+                "SELECT signature FROM invoice_fingerprints WHERE invoice_id = ?", (exclude_invoice_id,)
+            ).fetchone()
+            features["signature"] = _parse_signature(row[0]) if row else None
+
+        rows = conn.execute("""
+            SELECT fp.invoice_id, inv.vendor, inv.total_amount, inv.due_date, fp.due_day, fp.signature
+            FROM invoice_fingerprints AS fp
+            JOIN invoices AS inv ON inv.invoice_id = fp.invoice_id
+            WHERE fp.amount_bucket IN (?, ?, ?) AND fp.due_day BETWEEN ? AND ?
+              AND fp.invoice_id IS NOT ?
+        """, (bucket - 1, bucket, bucket + 1, day - DATE_WINDOW_DAYS, day + DATE_WINDOW_DAYS,
+              exclude_invoice_id)).fetchall()
+
+    invoice = {
+        "Vendor": invoice_data.get("Vendor"),
+        "Total_Amount": invoice_data.get("Total_Amount"),
+        "due_day": day,
+        "signature": features["signature"],
+    }
+    near_duplicates = []
+    for invoice_id, vendor, total_amount, due_date, candidate_day, signature in rows:
+        if (vendor, total_amount, due_date) == (invoice_data.get("Vendor"), invoice_data.get("Total_Amount"),
+                                                 invoice_data.get("Due_Date")):
+            continue
+        candidate = {"Vendor": vendor, "Total_Amount": total_amount, "due_day": candidate_day,
+                     "signature": _parse_signature(signature)}
+        if is_near_duplicate(invoice, candidate):
+            near_duplicates.append(invoice_id)
+    return near_duplicates
+
+def _parse_signature(text):
+    """Reads a stored comma-separated MinHash signature."""
+    return [int(value) for value in text.split(",")] if text else None
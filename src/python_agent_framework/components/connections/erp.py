@@ -0,0 +1,128 @@
+# connections/erp.py
+
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utilities.lazy_imports import lazy_import
+
+requests = lazy_import("requests")
+
+# Without ERP_API_URL the ERP sync is only simulated
+ERP_API_URL = os.getenv("ERP_API_URL")
+ERP_API_KEY = os.getenv("ERP_API_KEY")
+ERP_BATCH_SIZE = int(os.getenv("ERP_BATCH_SIZE", 200))
+ERP_TIMEOUT = float(os.getenv("ERP_TIMEOUT", 30))
+
+BULK_SYNC_PATH = "/invoices/bulk"
+
+
+class ERPClient:
+    """
+    Pushes invoice status changes to the ERP system in bulk payloads.
+
+    Updates are grouped into POSTs of up to ``batch_size`` invoices on one
+    keep-alive ``requests.Session``. Without a ``base_url`` the sync is only
+    simulated.
+    """
+
+    def __init__(self, base_url=ERP_API_URL, api_key=ERP_API_KEY, batch_size=ERP_BATCH_SIZE, timeout=ERP_TIMEOUT):
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.requests_sent = 0
+        self._session = None
+        self._lock = threading.Lock()
+        self._headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+    def sync_invoices(self, updates):
+        """
+        Sends invoice status updates to the ERP.
+
+        :param updates: List of {"invoice_id": ..., "status": ...} dictionaries.
+        :return: Number of invoices acknowledged.
+        """
+        if not updates:
+            return 0
+        if self.base_url is None:
+            return len(updates)
+
+        synced = 0
+        with self._lock:
+            if self._session is None:
+                self._session = requests.Session()
+            for start in range(0, len(updates), self.batch_size):
+                batch = updates[start:start + self.batch_size]
+                response = self._session.post(
+                    f"{self.base_url}{BULK_SYNC_PATH}",
+                    json={"invoices": batch},
+                    headers=self._headers,
+                    timeout=self.timeout,
+                )
+                response.raise_for_status()
+                self.requests_sent += 1
+                synced += response.json().get("accepted", len(batch))
+        return synced
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+class MockERPServer:
+    """
+    Local stand-in for the ERP bulk endpoint.
+
+    Accepts ``POST /invoices/bulk`` on a background thread and records every
+    payload in ``payloads``; point an ERPClient at ``url`` to use it.
+    Payloads with a status in ``rejected_statuses`` get a 503 instead, to
+    simulate an outage of one ERP operation.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.payloads = []
+        self.rejected_statuses = set()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like a real ERP gateway
+
+            def do_POST(self):
+                if self.path != BULK_SYNC_PATH:
+                    self.send_error(404)
+                    return
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if any(update.get("status") in server.rejected_statuses for update in payload.get("invoices", [])):
+                    self.send_error(503)
+                    return
+                server.payloads.append(payload)
+                body = json.dumps({"accepted": len(payload.get("invoices", []))}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-erp", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,132 @@
+# connections/extraction_cache.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+from components.connections.database import get_connection, transaction
+
+# Cache lives in its own database file so it can be deleted without touching invoices
+CACHE_DB_PATH = os.getenv("EXTRACTION_CACHE_PATH", "src/python_agent_framework/extraction_cache.db")
+CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Cache databases whose schema was already created in this process
+_INITIALIZED_CACHES = set()
+
+
+class ExtractionCache:
+    """
+    Persistent cache of Gemini extraction results keyed by image content.
+
+    Keys are a SHA-256 of the image's content digest together with the model
+    name, prompt and preprocessing settings, so changing any of them
+    invalidates old entries. When the stored
+    payloads exceed ``max_bytes`` the least recently used entries are evicted.
+    """
+
+    def __init__(self, db_path=CACHE_DB_PATH, max_bytes=CACHE_MAX_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._init_schema()
+
+    def _init_schema(self):
+        """Creates the cache table once per process and database file (agents build a cache each)."""
+        if self.db_path in _INITIALIZED_CACHES and os.path.exists(self.db_path):
+            return
+
+        with transaction(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS extraction_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    payload TEXT,  -- JSON String
+                    size_bytes INTEGER,
+                    created_at REAL,
+                    last_used REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_used ON extraction_cache (last_used)")
+        _INITIALIZED_CACHES.add(self.db_path)
+
+    @staticmethod
+    def make_key(image_digest, model_name, prompt, preprocessing=""):
+        """Builds the cache key for an image (by content digest) under a given model and prompt."""
+        digest = hashlib.sha256()
+        for part in (model_name, prompt, preprocessing, image_digest):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, cache_key):
+        """Returns the cached extraction for ``cache_key`` or None on a miss."""
+        with get_connection(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT payload FROM extraction_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE extraction_cache SET last_used = ? WHERE cache_key = ?", (time.time(), cache_key)
+                )
+
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, cache_key, invoice_data):
+        """Stores an extraction result and evicts old entries if the cache is full."""
+        payload = json.dumps(invoice_data)
+        now = time.time()
+        with transaction(self.db_path) as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO extraction_cache (cache_key, payload, size_bytes, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?)
+            """, (cache_key, payload, len(payload), now, now))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """Deletes least recently used entries until the cache fits in ``max_bytes``."""
+        total_bytes = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM extraction_cache").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+
+        evicted = 0
+        while total_bytes > self.max_bytes:
+            oldest = conn.execute(
+                "SELECT cache_key, size_bytes FROM extraction_cache ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not oldest:
+                break
+            for cache_key, size_bytes in oldest:
+                if total_bytes <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM extraction_cache WHERE cache_key = ?", (cache_key,))
+                total_bytes -= size_bytes
+                evicted += 1
+
+        with self._lock:
+            self.evictions += evicted
+
+    def stats(self):
+        """Returns hit/miss counters and current cache size."""
+        with get_connection(self.db_path) as conn:
+            entries, total_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM extraction_cache"
+            ).fetchone()
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": total_bytes,
+            }
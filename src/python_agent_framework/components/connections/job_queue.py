@@ -0,0 +1,247 @@
+# connections/job_queue.py
+
+import json
+import os
+import socket
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+from components.connections.database import get_connection, transaction
+
+# Stages every invoice job goes through, in order
+STAGES = ("extract", "analyze", "notify", "execute")
+DONE = "done"
+
+# A claimed job must report progress within this many seconds or it may be reclaimed
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 300))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+
+# Job keys per "IN (...)" lookup (stays below SQLite's variable limit)
+LOOKUP_BATCH_SIZE = 500
+
+
+@dataclass
+class Job:
+    """A claimed invoice job; ``stage`` is the next stage to run."""
+    job_id: int
+    path: str
+    stage: str
+    attempts: int
+    invoice_id: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None  # Analysis results, kept once the analyze stage finished
+
+
+def job_key(path: str) -> str:
+    """
+    Identifies an invoice file: its resolved absolute path plus size and modification time.
+
+    The same file reached through different relative paths or links maps to
+    one job, while a file replaced under a reused name gets a new one.
+    """
+    path = os.path.realpath(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return path
+    return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class JobQueue:
+    """
+    Durable, SQLite-backed queue of invoice processing jobs.
+
+    Jobs are keyed by job_key, so an invoice keeps its progress across runs
+    only while its file is unchanged. Each job records the next stage to
+    run, its attempts and a lease (owner + expiry). Claims happen inside ``BEGIN IMMEDIATE`` transactions,
+    so several processes can share one queue without claiming the same job.
+    Progress is committed after every stage, so a restarted batch resumes a
+    job at the stage where it stopped; a stage interrupted by a crash runs
+    again (at-least-once).
+    """
+
+    def __init__(self, db_path=None, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS, owner=None):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+
+        with transaction(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS invoice_jobs (
+                    job_id INTEGER PRIMARY KEY,
+                    job_key TEXT NOT NULL UNIQUE,  -- See job_key()
+                    path TEXT NOT NULL,  -- Resolved absolute path
+                    stage TEXT NOT NULL DEFAULT 'extract',  -- Next stage to run, or 'done'
+                    state TEXT NOT NULL DEFAULT 'pending',  -- "pending", "running", "done", "failed"
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    invoice_id TEXT,
+                    result TEXT,  -- JSON String
+                    last_error TEXT,
+                    summary TEXT,  -- JSON String of the final batch summary line, once the job finished
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    updated_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_invoice_jobs_claim ON invoice_jobs (state, lease_expires)")
+            migrate_job_columns(conn)
+
+    def enqueue(self, paths: Iterable[str]) -> int:
+        """Adds a pending job per invoice file; unchanged files that already have a job keep their progress."""
+        now = time.time()
+        with transaction(self.db_path) as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO invoice_jobs (job_key, path, updated_at) VALUES (?, ?, ?)",
+                ((job_key(path), os.path.realpath(path), now) for path in paths),
+            )
+            return conn.total_changes - before
+
+    def reset(self, paths: Iterable[str]):
+        """Discards the recorded progress of ``paths`` so they are processed from scratch."""
+        with transaction(self.db_path) as conn:
+            conn.executemany("DELETE FROM invoice_jobs WHERE job_key = ?", ((job_key(path),) for path in paths))
+
+    def claim(self, limit: int = 1) -> List[Job]:
+        """
+        Leases up to ``limit`` jobs that are pending or whose lease has expired.
+
+        Every claim counts as an attempt; jobs that used up ``max_attempts``
+        are marked failed instead of being handed out again.
+        """
+        now = time.time()
+        with transaction(self.db_path) as conn:
+            conn.execute("""
+                UPDATE invoice_jobs SET state = 'failed', lease_owner = NULL, updated_at = ?,
+                       last_error = COALESCE(last_error, 'Lease expired too many times.')
+                WHERE state = 'running' AND lease_expires < ? AND attempts >= ?
+            """, (now, now, self.max_attempts))
+            rows = conn.execute("""
+                SELECT job_id, path, stage, attempts, invoice_id, result FROM invoice_jobs
+                WHERE state = 'pending' OR (state = 'running' AND lease_expires < ?)
+                ORDER BY job_id
+                LIMIT ?
+            """, (now, limit)).fetchall()
+            conn.executemany("""
+                UPDATE invoice_jobs
+                SET state = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires = ?, updated_at = ?
+                WHERE job_id = ?
+            """, ((self.owner, now + self.lease_seconds, now, row[0]) for row in rows))
+
+        return [
+            Job(job_id, path, stage, attempts + 1, invoice_id, json.loads(result) if result else None)
+            for job_id, path, stage, attempts, invoice_id, result in rows
+        ]
+
+    def advance(self, job: Job, stage: str, invoice_id=None, result=None) -> bool:
+        """
+        Records that ``job`` finished the stage before ``stage`` and renews its lease.
+
+        Returns False if the lease was lost to another worker, in which case
+        the caller must stop working on the job.
+        """
+        if invoice_id is not None:
+            job.invoice_id = invoice_id
+        if result is not None:
+            job.result = result
+        job.stage = stage
+        now = time.time()
+        finished = stage == DONE
+        with transaction(self.db_path) as conn:
+            updated = conn.execute("""
+                UPDATE invoice_jobs
+                SET stage = ?, state = ?, invoice_id = ?, result = ?, last_error = NULL,
+                    lease_owner = ?, lease_expires = ?, updated_at = ?
+                WHERE job_id = ? AND lease_owner = ?
+            """, (
+                stage, "done" if finished else "running", job.invoice_id,
+                json.dumps(job.result) if job.result is not None else None,
+                None if finished else self.owner, None if finished else now + self.lease_seconds, now,
+                job.job_id, self.owner,
+            )).rowcount
+        return updated == 1
+
+    def fail(self, job: Job, error: str) -> bool:
+        """
+        Releases a job after an error; it is retried later unless it used up its attempts.
+
+        :return: True if the job will be retried, or is already held by another
+            worker after its lease expired; False if it failed for good.
+        """
+        retry = job.attempts < self.max_attempts
+        with transaction(self.db_path) as conn:
+            updated = conn.execute("""
+                UPDATE invoice_jobs
+                SET state = ?, last_error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                WHERE job_id = ? AND lease_owner = ?
+            """, ("pending" if retry else "failed", error, time.time(), job.job_id, self.owner)).rowcount
+        return retry or updated == 0
+
+    def record_summaries(self, summaries: Iterable[tuple]):
+        """Stores the final summary line of finished jobs, given as (job, summary dictionary) pairs."""
+        with transaction(self.db_path) as conn:
+            conn.executemany(
+                "UPDATE invoice_jobs SET summary = ? WHERE job_id = ?",
+                ((json.dumps(summary), job.job_id) for job, summary in summaries),
+            )
+
+    def summaries(self, paths: List[str]) -> List[Dict[str, Any]]:
+        """Returns the stored summaries of the finished jobs for ``paths``, in job order."""
+        keys = [job_key(path) for path in paths]
+        rows = []
+        with get_connection(self.db_path) as conn:
+            for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+                batch = keys[start:start + LOOKUP_BATCH_SIZE]
+                rows.extend(conn.execute(f"""
+                    SELECT job_id, summary FROM invoice_jobs
+                    WHERE job_key IN ({", ".join("?" * len(batch))}) AND summary IS NOT NULL
+                """, batch).fetchall())
+        return [json.loads(summary) for _, summary in sorted(rows)]
+
+    def recover_orphans(self) -> int:
+        """
+        Releases leases held by processes on this host that are no longer running.
+
+        Lets a restarted batch resume immediately instead of waiting for the
+        dead process's leases to expire. Attempts are not refunded.
+        """
+        host = socket.gethostname()
+        with get_connection(self.db_path) as conn:
+            owners = [row[0] for row in conn.execute(
+                "SELECT DISTINCT lease_owner FROM invoice_jobs WHERE state = 'running' AND lease_owner LIKE ?",
+                (f"{host}:%",),
+            )]
+        dead = [owner for owner in owners if owner != self.owner and not _process_alive(owner.rpartition(":")[2])]
+        if not dead:
+            return 0
+
+        with transaction(self.db_path) as conn:
+            before = conn.total_changes
+            conn.executemany("""
+                UPDATE invoice_jobs SET lease_expires = 0
+                WHERE state = 'running' AND lease_owner = ?
+            """, ((owner,) for owner in dead))
+            return conn.total_changes - before
+
+    def counts(self) -> Dict[str, int]:
+        """Returns the number of jobs per state."""
+        with get_connection(self.db_path) as conn:
+            return dict(conn.execute("SELECT state, COUNT(*) FROM invoice_jobs GROUP BY state").fetchall())
+
+
+def migrate_job_columns(conn):
+    """Adds columns introduced after an ``invoice_jobs`` table was created."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(invoice_jobs)")}
+    if "summary" not in columns:
+        conn.execute("ALTER TABLE invoice_jobs ADD COLUMN summary TEXT")
+
+
+def _process_alive(pid):
+    """Checks whether a local process id is still running."""
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True  # Exists but belongs to someone else, or not a pid we can judge
+    return True
@@ -0,0 +1,326 @@
+# connections/mail.py
+
+import atexit
+import contextlib
+import mailbox
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
+
+try:
+    import fcntl
+except ImportError:  # Windows: FileTransport then only serializes the threads of one process
+    fcntl = None
+
+# SMTP settings; without SMTP_HOST emails go to MAIL_SINK_PATH or are only printed
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 25))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "false").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 30))
+MAIL_SENDER = os.getenv("MAIL_SENDER", "invoices@example.com")
+MAIL_SINK_PATH = os.getenv("MAIL_SINK_PATH")
+
+# Idle SMTP sessions are probed with NOOP before reuse after this many seconds
+SMTP_IDLE_CHECK_SECONDS = 30
+
+# Transient failures (dropped sessions, 4xx replies) are retried with exponential backoff
+SMTP_MAX_ATTEMPTS = int(os.getenv("SMTP_MAX_ATTEMPTS", 4))
+SMTP_BACKOFF_SECONDS = float(os.getenv("SMTP_BACKOFF_SECONDS", 0.5))
+
+# Persistent SMTP sessions (one per delivery thread) used for background sends
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 2))
+MAIL_QUEUE_SIZE = 1000
+
+
+def build_message(recipient, subject, body, sender=MAIL_SENDER):
+    """Builds a plain-text email message."""
+    message = MIMEText(body, "plain", "utf-8")
+    message["From"] = sender
+    message["To"] = recipient
+    message["Subject"] = subject
+    message["Date"] = formatdate(localtime=True)
+    message["Message-ID"] = make_msgid()
+    return message
+
+
+def _is_session_failure(error):
+    """True when the SMTP session itself is unusable: dropped, never opened, or a socket error."""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    # SMTPException subclasses OSError; only non-SMTP OSErrors are network failures
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def is_transient_smtp_error(error):
+    """
+    True for failures worth retrying: lost connections and 4xx replies.
+
+    A refused recipient is only transient if every refusal was a 4xx reply;
+    a 5xx such as "550 No such user" will not succeed on a retry.
+    """
+    if _is_session_failure(error):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return bool(error.recipients) and all(400 <= code < 500 for code, _ in error.recipients.values())
+    return False
+
+
+class PrintTransport:
+    """Prints emails to stdout instead of delivering them (the MVP behaviour)."""
+
+    def send(self, recipient, subject, body):
+        print(f"\n📧 Sending Email to {recipient}...")
+        print(f"📌 Subject: {subject}")
+        print(f"📝 Body: {body}\n")
+
+    def close(self):
+        pass
+
+
+class FileTransport:
+    """
+    Appends emails to an mbox file; a local stand-in for a mail server.
+
+    Writers in other processes (e.g. ``--workers`` batch workers) are
+    serialized with a blocking ``flock`` on a ``.lock`` file next to the
+    mbox; ``mailbox.mbox.lock`` does not wait and fails under contention.
+    """
+
+    def __init__(self, path, sender=MAIL_SENDER):
+        self.path = path
+        self.sender = sender
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def send(self, recipient, subject, body):
+        with self._lock, self._file_lock():
+            sink = mailbox.mbox(self.path)
+            try:
+                sink.add(build_message(recipient, subject, body, self.sender))
+                sink.flush()
+            finally:
+                sink.close()
+
+    def close(self):
+        pass
+
+
+class SMTPTransport:
+    """
+    Sends emails over one persistent SMTP session.
+
+    The session is opened on first use and reused for later messages; it is
+    re-opened if the server dropped it. Transient failures are retried up to
+    ``max_attempts`` times with exponential backoff and jitter; permanent
+    (5xx) errors are raised immediately.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, username=SMTP_USERNAME, password=SMTP_PASSWORD,
+                 starttls=SMTP_STARTTLS, timeout=SMTP_TIMEOUT, sender=MAIL_SENDER,
+                 max_attempts=SMTP_MAX_ATTEMPTS, backoff=SMTP_BACKOFF_SECONDS):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.sender = sender
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.retries = 0
+        self._smtp = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()  # Don't leak the socket of a half-opened session
+            raise
+        return smtp
+
+    def _session(self):
+        """Returns a live session, probing one that sat idle and reconnecting if needed."""
+        if self._smtp is not None and time.monotonic() - self._last_used > SMTP_IDLE_CHECK_SECONDS:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected("NOOP failed")
+            except (smtplib.SMTPException, OSError):
+                self._discard()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def _discard(self):
+        try:
+            self._smtp.close()
+        except (smtplib.SMTPException, OSError, AttributeError):
+            pass
+        self._smtp = None
+
+    def send(self, recipient, subject, body):
+        message = build_message(recipient, subject, body, self.sender)
+        with self._lock:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    self._session().send_message(message)
+                    self._last_used = time.monotonic()
+                    return
+                except Exception as e:
+                    if not is_transient_smtp_error(e) or attempt == self.max_attempts:
+                        raise
+                    if _is_session_failure(e):
+                        self._discard()  # The session itself is broken; reconnect on the next attempt
+                    self.retries += 1
+                    time.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+    def close(self):
+        with self._lock:
+            if self._smtp is not None:
+                try:
+                    self._smtp.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self._discard()
+
+
+class BackgroundMailer:
+    """
+    Delivers emails asynchronously from a queue on a pool of worker threads.
+
+    ``send`` only enqueues the message, so callers never wait on the mail
+    server. Each worker owns one persistent transport (by default an
+    SMTPTransport, which retries transient failures), giving a pool of
+    ``pool_size`` reusable SMTP sessions. Messages that still fail are
+    counted and reported, not raised. Queued mail is delivered on ``close``,
+    which also runs at interpreter exit.
+    """
+
+    def __init__(self, transport_factory=SMTPTransport, pool_size=SMTP_POOL_SIZE, max_queue=MAIL_QUEUE_SIZE):
+        self.sent = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._counts_lock = threading.Lock()
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._work, args=(transport_factory,), name=f"mail-sender-{number}", daemon=True)
+            for number in range(pool_size)
+        ]
+        for worker in self._workers:
+            worker.start()
+        atexit.register(self.close)
+
+    def _work(self, transport_factory):
+        transport = transport_factory()
+        try:
+            while True:
+                message = self._queue.get()
+                if message is None:
+                    self._queue.task_done()
+                    return
+                try:
+                    transport.send(*message)
+                    with self._counts_lock:
+                        self.sent += 1
+                except Exception as e:
+                    with self._counts_lock:
+                        self.failed += 1
+                    print(f"⚠️ Failed to deliver email to {message[0]}: {str(e)}")
+                finally:
+                    self._queue.task_done()
+        finally:
+            transport.close()
+
+    def send(self, recipient, subject, body):
+        """Queues an email for delivery (blocks only while the queue is full)."""
+        if self._closed:
+            raise RuntimeError("The mailer has been closed.")
+        self._queue.put((recipient, subject, body))
+
+    def flush(self):
+        """Waits until every queued email has been delivered or has failed."""
+        self._queue.join()
+
+    def close(self):
+        """Delivers the remaining queue, then stops the workers and their SMTP sessions."""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        atexit.unregister(self.close)
+
+
+# The process-wide BackgroundMailer handed out by get_transport
+_MAILER = None
+_MAILER_LOCK = threading.Lock()
+
+
+def get_mailer():
+    """Returns the process's shared BackgroundMailer, starting it (again, if it was closed) on first use."""
+    global _MAILER
+    with _MAILER_LOCK:
+        if _MAILER is None or _MAILER._closed:
+            _MAILER = BackgroundMailer()
+        return _MAILER
+
+
+def _forget_mailer_after_fork():
+    """
+    Drops the parent's mailer in a forked child.
+
+    Its worker threads do not exist in the child and its SMTP sockets belong
+    to the parent, so the child starts its own mailer when it first sends.
+    """
+    global _MAILER, _MAILER_LOCK
+    _MAILER_LOCK = threading.Lock()
+    if _MAILER is not None:
+        atexit.unregister(_MAILER.close)  # Closing it would wait on workers the child never had
+    _MAILER = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_mailer_after_fork)
+
+
+def get_transport(background=True):
+    """
+    Picks the mail transport configured through the environment.
+
+    With SMTP configured, ``background`` selects the shared BackgroundMailer
+    so sends do not block the caller and every agent uses the same pool of
+    SMTP sessions; callers that already run off the hot path (the outbox
+    flusher) use a plain SMTPTransport to learn about failures.
+    """
+    if SMTP_HOST:
+        return get_mailer() if background else SMTPTransport()
+    if MAIL_SINK_PATH:
+        return FileTransport(MAIL_SINK_PATH)
+    return PrintTransport()
@@ -0,0 +1,189 @@
+# connections/outbox.py
+
+import os
+import threading
+import time
+import uuid
+from components.connections.database import get_connection, transaction
+from components.connections.mail import get_transport
+
+# A recipient's queued messages are sent as one digest once either limit is reached
+DIGEST_MAX_MESSAGES = int(os.getenv("NOTIFY_DIGEST_MAX_MESSAGES", 50))
+DIGEST_MAX_WAIT_SECONDS = float(os.getenv("NOTIFY_DIGEST_MAX_WAIT_SECONDS", 300))
+
+# Claimed messages not sent within this time (e.g. the process died) are claimable again
+CLAIM_TIMEOUT_SECONDS = 600
+
+DIGEST_SEPARATOR = "\n\n" + "-" * 40 + "\n\n"
+
+
+def compose_digest(messages):
+    """
+    Combines (subject, body) pairs for one recipient into a single email.
+
+    :return: (subject, body); a single message is returned unchanged.
+    """
+    if len(messages) == 1:
+        return messages[0]
+
+    subjects = list(dict.fromkeys(subject for subject, _ in messages))
+    if len(subjects) == 1:
+        subject = f"{subjects[0]} ({len(messages)} invoices)"
+    else:
+        subject = f"{len(messages)} Invoice Notifications"
+    body = (
+        f"This message combines {len(messages)} notifications.{DIGEST_SEPARATOR}"
+        + DIGEST_SEPARATOR.join(body for _, body in messages)
+    )
+    return subject, body
+
+
+class NotificationOutbox:
+    """
+    Durable outbox that coalesces notifications into per-recipient digests.
+
+    ``add`` only writes a row to the ``notification_outbox`` table. A
+    background thread sends a recipient's messages as one digest once
+    ``max_messages`` are queued or the oldest has waited ``max_wait``
+    seconds, through a single reused transport. Rows are deleted only after
+    a successful send, so messages queued before a crash go out on the next
+    run; several processes can share the table.
+    """
+
+    def __init__(self, transport=None, db_path=None, max_messages=DIGEST_MAX_MESSAGES,
+                 max_wait=DIGEST_MAX_WAIT_SECONDS, autostart=True):
+        # Synchronous sends: rows are only deleted once the server accepted the digest
+        self.transport = transport or get_transport(background=False)
+        self.db_path = db_path
+        self.max_messages = max_messages
+        self.max_wait = max_wait
+        self.digests_sent = 0
+        self.messages_sent = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+        with transaction(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS notification_outbox (
+                    message_id INTEGER PRIMARY KEY,
+                    recipient TEXT NOT NULL,
+                    subject TEXT,
+                    body TEXT,
+                    created_at REAL,
+                    claim_token TEXT,  -- Set while a flush is sending the message
+                    claimed_at REAL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_outbox_recipient ON notification_outbox (recipient, created_at)"
+            )
+
+        if autostart:
+            self.start()
+
+    def start(self):
+        """Starts the background flusher thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="notification-outbox", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        interval = max(min(self.max_wait / 4, 30.0), 0.05)
+        while not self._stop.is_set():
+            self._wake.wait(timeout=interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Notification outbox flush failed: {str(e)}")
+
+    def add(self, recipient, subject, body):
+        """Queues a notification; wakes the flusher when the recipient's digest is full."""
+        with transaction(self.db_path) as conn:
+            conn.execute(
+                "INSERT INTO notification_outbox (recipient, subject, body, created_at) VALUES (?, ?, ?, ?)",
+                (recipient, subject, body, time.time()),
+            )
+            queued = conn.execute(
+                "SELECT COUNT(*) FROM notification_outbox WHERE recipient = ? AND claim_token IS NULL",
+                (recipient,),
+            ).fetchone()[0]
+        if queued >= self.max_messages:
+            self._wake.set()
+
+    def _claim(self, force):
+        """Claims the messages of every recipient whose digest is due; returns (token, rows)."""
+        token = uuid.uuid4().hex
+        now = time.time()
+        with transaction(self.db_path) as conn:
+            recipients = [row[0] for row in conn.execute("""
+                SELECT recipient FROM notification_outbox
+                WHERE claim_token IS NULL OR claimed_at < ?
+                GROUP BY recipient
+                HAVING ? OR COUNT(*) >= ? OR MIN(created_at) <= ?
+            """, (now - CLAIM_TIMEOUT_SECONDS, force, self.max_messages, now - self.max_wait))]
+            conn.executemany("""
+                UPDATE notification_outbox SET claim_token = ?, claimed_at = ?
+                WHERE recipient = ? AND (claim_token IS NULL OR claimed_at < ?)
+            """, ((token, now, recipient, now - CLAIM_TIMEOUT_SECONDS) for recipient in recipients))
+
+        with get_connection(self.db_path) as conn:
+            rows = conn.execute("""
+                SELECT message_id, recipient, subject, body FROM notification_outbox
+                WHERE claim_token = ? ORDER BY recipient, message_id
+            """, (token,)).fetchall()
+        return token, rows
+
+    def flush(self, force=False):
+        """
+        Sends every due digest (all queued messages when ``force`` is set).
+
+        :return: Number of digests sent.
+        """
+        with self._flush_lock:
+            token, rows = self._claim(force)
+
+            by_recipient = {}
+            for message_id, recipient, subject, body in rows:
+                by_recipient.setdefault(recipient, []).append((message_id, subject, body))
+
+            sent = 0
+            for recipient, messages in by_recipient.items():
+                for start in range(0, len(messages), self.max_messages):
+                    chunk = messages[start:start + self.max_messages]
+                    message_ids = [(message_id,) for message_id, _, _ in chunk]
+                    try:
+                        self.transport.send(recipient, *compose_digest([(subject, body) for _, subject, body in chunk]))
+                    except Exception as e:
+                        print(f"⚠️ Failed to send notifications to {recipient}: {str(e)}")
+                        with transaction(self.db_path) as conn:
+                            conn.executemany(
+                                "UPDATE notification_outbox SET claim_token = NULL, claimed_at = NULL "
+                                "WHERE message_id = ? AND claim_token = ?",
+                                ((message_id, token) for (message_id,) in message_ids),
+                            )
+                        continue
+
+                    with transaction(self.db_path) as conn:
+                        conn.executemany("DELETE FROM notification_outbox WHERE message_id = ?", message_ids)
+                    sent += 1
+                    self.messages_sent += len(chunk)
+            self.digests_sent += sent
+            return sent
+
+    def pending(self):
+        """Returns the number of queued messages not yet sent."""
+        with get_connection(self.db_path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM notification_outbox").fetchone()[0]
+
+    def close(self):
+        """Stops the flusher, sends everything still queued and closes the transport."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush(force=True)
+        self.transport.close()
@@ -0,0 +1,189 @@
+# connections/payments.py
+
+import heapq
+import os
+import threading
+import time
+from datetime import date, timedelta
+from components.connections.database import LOOKUP_BATCH_SIZE, get_connection, transaction
+
+# Payments released together (one transaction, one ERP payload) per batch
+PAYMENT_BATCH_SIZE = int(os.getenv("PAYMENT_BATCH_SIZE", 500))
+
+
+class PaymentScheduler:
+    """
+    Schedules payments of approved invoices and releases them as they fall due.
+
+    Scheduled payments live in the ``payments`` table and, in memory, in a
+    min-heap ordered by due date, so a tick only pops the payments that are
+    due instead of scanning the invoice table. The heap is rebuilt from the
+    table on start-up, so scheduled payments survive restarts. Releases are
+    guarded by the payment's status, so several processes can share the
+    table without paying an invoice twice. Invoices without an ISO due date
+    are due immediately.
+    """
+
+    def __init__(self, db_path=None, batch_size=PAYMENT_BATCH_SIZE):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._heap = []  # (due_date, invoice_id)
+        self._scheduled = {}  # invoice_id -> due_date of the live heap entry
+        self._lock = threading.Lock()
+
+        with transaction(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS payments (
+                    invoice_id TEXT PRIMARY KEY REFERENCES invoices (invoice_id) ON DELETE CASCADE,
+                    vendor TEXT,
+                    amount REAL,
+                    due_date TEXT NOT NULL,  -- ISO date the payment is released on
+                    status TEXT NOT NULL DEFAULT 'scheduled',  -- "scheduled", "released"
+                    scheduled_at REAL,
+                    released_at REAL
+                )
+            """)
+            # Serves both the start-up load and due_within() as range scans
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_payments_due ON payments (status, due_date)")
+            rows = conn.execute(
+                "SELECT due_date, invoice_id FROM payments WHERE status = 'scheduled'"
+            ).fetchall()
+
+        self._heap = [tuple(row) for row in rows]
+        heapq.heapify(self._heap)
+        self._scheduled = {invoice_id: due_date for due_date, invoice_id in self._heap}
+
+    def schedule(self, invoice_ids, today=None):
+        """
+        Schedules the payment of stored invoices on their due dates.
+
+        Invoices that already have a payment keep it.
+
+        :return: Number of payments newly scheduled.
+        """
+        invoice_ids = list(invoice_ids)
+        today = (today or date.today()).isoformat()
+        now = time.time()
+        rows = []
+        with transaction(self.db_path) as conn:
+            for start in range(0, len(invoice_ids), LOOKUP_BATCH_SIZE):
+                batch = invoice_ids[start:start + LOOKUP_BATCH_SIZE]
+                placeholders = ", ".join("?" * len(batch))
+                rows.extend(conn.execute(f"""
+                    SELECT inv.invoice_id, inv.vendor, inv.total_amount, COALESCE(date(inv.due_date), ?)
+                    FROM invoices AS inv
+                    WHERE inv.invoice_id IN ({placeholders})
+                      AND NOT EXISTS (SELECT 1 FROM payments AS pay WHERE pay.invoice_id = inv.invoice_id)
+                """, [today, *batch]))
+            conn.executemany(
+                "INSERT OR IGNORE INTO payments (invoice_id, vendor, amount, due_date, scheduled_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                ((invoice_id, vendor, amount, due_date, now) for invoice_id, vendor, amount, due_date in rows),
+            )
+
+        with self._lock:
+            for invoice_id, _, _, due_date in rows:
+                if invoice_id not in self._scheduled:
+                    self._scheduled[invoice_id] = due_date
+                    heapq.heappush(self._heap, (due_date, invoice_id))
+        return len(rows)
+
+    def release_due(self, today=None, send=None):
+        """
+        Releases every scheduled payment due on or before ``today``.
+
+        Payments are released in batches of ``batch_size``, each marked
+        released in its own transaction and then handed to ``send`` (e.g. the
+        ERP "Paid" sync). If ``send`` raises, that batch is marked scheduled
+        again and it and the remaining due payments go back on the heap for
+        the next release before the error is re-raised.
+
+        :return: List of batches, each a list of {"invoice_id", "vendor", "amount", "due_date"} dictionaries.
+        """
+        today = (today or date.today()).isoformat()
+        due = []  # (due_date, invoice_id)
+        with self._lock:
+            while self._heap and self._heap[0][0] <= today:
+                due_date, invoice_id = heapq.heappop(self._heap)
+                if self._scheduled.get(invoice_id) == due_date:
+                    del self._scheduled[invoice_id]
+                    due.append((due_date, invoice_id))
+
+        batches = []
+        for start in range(0, len(due), self.batch_size):
+            batch = self._release([invoice_id for _, invoice_id in due[start:start + self.batch_size]])
+            if not batch:
+                continue
+            if send is not None:
+                try:
+                    send(batch)
+                except Exception:
+                    self._unrelease(batch)
+                    self._requeue(due[start:])
+                    raise
+            batches.append(batch)
+        return batches
+
+    def _unrelease(self, batch):
+        """Marks the payments of a batch that could not be sent scheduled again."""
+        with transaction(self.db_path) as conn:
+            conn.executemany(
+                "UPDATE payments SET status = 'scheduled', released_at = NULL WHERE invoice_id = ? AND status = 'released'",
+                ((payment["invoice_id"],) for payment in batch),
+            )
+
+    def _requeue(self, due):
+        """Puts (due_date, invoice_id) entries back on the heap; _release skips any released elsewhere meanwhile."""
+        with self._lock:
+            for due_date, invoice_id in due:
+                if invoice_id not in self._scheduled:
+                    self._scheduled[invoice_id] = due_date
+                    heapq.heappush(self._heap, (due_date, invoice_id))
+
+    def _release(self, invoice_ids):
+        """Marks still-scheduled payments released; returns the ones this call released."""
+        now = time.time()
+        with transaction(self.db_path) as conn:
+            # Another process sharing the table may already have released some of them
+            released = [
+                invoice_id for invoice_id in invoice_ids
+                if conn.execute(
+                    "UPDATE payments SET status = 'released', released_at = ? WHERE invoice_id = ? AND status = 'scheduled'",
+                    (now, invoice_id),
+                ).rowcount == 1
+            ]
+            rows = []
+            for start in range(0, len(released), LOOKUP_BATCH_SIZE):
+                batch = released[start:start + LOOKUP_BATCH_SIZE]
+                placeholders = ", ".join("?" * len(batch))
+                rows.extend(conn.execute(f"""
+                    SELECT invoice_id, vendor, amount, due_date FROM payments
+                    WHERE invoice_id IN ({placeholders}) ORDER BY due_date, invoice_id
+                """, batch))
+        return [
+            {"invoice_id": invoice_id, "vendor": vendor, "amount": amount, "due_date": due_date}
+            for invoice_id, vendor, amount, due_date in rows
+        ]
+
+    def due_within(self, days, today=None):
+        """
+        Lists scheduled payments due in the next ``days`` days (including overdue ones).
+
+        Answered from the (status, due_date) index without touching the invoices table.
+        """
+        until = ((today or date.today()) + timedelta(days=days)).isoformat()
+        with get_connection(self.db_path) as conn:
+            rows = conn.execute("""
+                SELECT invoice_id, vendor, amount, due_date FROM payments
+                WHERE status = 'scheduled' AND due_date <= ?
+                ORDER BY due_date, invoice_id
+            """, (until,)).fetchall()
+        return [
+            {"invoice_id": invoice_id, "vendor": vendor, "amount": amount, "due_date": due_date}
+            for invoice_id, vendor, amount, due_date in rows
+        ]
+
+    def pending(self):
+        """Returns the number of payments scheduled but not yet released."""
+        with self._lock:
+            return len(self._scheduled)
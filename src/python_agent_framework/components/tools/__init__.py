@@ -6,7 +6,7 @@ from typing import Dict, Any, List
 from core.tool import Tool
 
 # Dictionary to hold registered tools
-TOOLS: Dict[str, Tool] = {}
+TOOLS: Dict[str, Tool]  # Populated on first access, see __getattr__
 
 
 def load_tools():
@@ -14,6 +14,7 @@ def load_tools():
     Dynamically discovers and registers all pre-instantiated Tool instances.
     """
     package_name = __name__
+    registry = {}
 
     for _, module_name, _ in pkgutil.iter_modules(__path__):
         module = importlib.import_module(f"{package_name}.{module_name}")
@@ -24,8 +25,14 @@ def load_tools():
             if isinstance(attr, Tool):  # Registers all instances found
                 if not attr.name:  
                     attr.name = module_name  # Assign module name as default name if missing
-                TOOLS[attr.name.lower().replace(" ", "_")] = attr  # Normalize key name
+                registry[attr.name.lower().replace(" ", "_")] = attr  # Normalize key name
 
+    globals()["TOOLS"] = registry
+    return registry
 
-# Load tools when the package is imported
-load_tools()
\ No newline at end of file
+
+def __getattr__(name):
+    """Imports the tool modules (and their HTTP clients) only once ``TOOLS`` is first used."""
+    if name == "TOOLS":
+        return load_tools()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
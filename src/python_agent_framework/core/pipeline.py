@@ -0,0 +1,199 @@
+# core/pipeline.py
+
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+import heapq
+import queue
+import threading
+
+
+@dataclass
+class Stage:
+    """A pipeline step: ``func`` maps one item to the input of the next stage."""
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: Optional[int] = None  # Bounded input queue; defaults to 2 * workers
+    batch_size: int = 1  # > 1: func maps a list of up to batch_size queued items to a list of outputs
+
+
+@dataclass
+class PipelineResult:
+    """Outcome of one input item after the last stage (or the stage that raised)."""
+    index: int
+    item: Any
+    value: Any = None
+    error: Optional[BaseException] = None
+    failed_stage: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class _Sentinel:
+    pass
+
+
+_END = _Sentinel()
+_POLL_SECONDS = 0.1
+
+
+class Pipeline:
+    """
+    Runs items through stages connected by bounded queues.
+
+    Every stage has its own worker threads, so stage N of item k overlaps
+    stage N-1 of item k+1. Full queues block upstream workers (backpressure)
+    and at most ``max_in_flight`` items are between input and output, so the
+    input iterable is consumed lazily. An exception in a stage ends that item
+    early: it is reported in its ``PipelineResult`` and the other items carry on.
+
+    A stage with ``batch_size`` > 1 receives whatever is already waiting in
+    its queue (up to ``batch_size`` items) as one list, so it can amortize
+    per-call costs such as transactions or HTTP requests; an exception then
+    fails every item of that batch.
+    """
+
+    def __init__(self, stages: List[Stage], ordered: bool = False, max_in_flight: Optional[int] = None):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage.")
+        self.stages = stages
+        self.ordered = ordered
+        self.max_in_flight = max_in_flight or sum(
+            stage.workers * stage.batch_size + self._queue_size(stage) for stage in stages
+        )
+
+    @staticmethod
+    def _queue_size(stage: Stage) -> int:
+        return stage.queue_size or 2 * stage.workers * stage.batch_size
+
+    def run(self, items: Iterable[Any]) -> Iterator[PipelineResult]:
+        """
+        Yields a PipelineResult per item, in input order if ``ordered`` else as items finish.
+
+        Closing the generator early stops the workers.
+        """
+        queues = [queue.Queue(maxsize=self._queue_size(stage)) for stage in self.stages]
+        results = queue.Queue()
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        stop = threading.Event()
+        feed_errors = []
+
+        def put(target, value):
+            while not stop.is_set():
+                try:
+                    target.put(value, timeout=_POLL_SECONDS)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def feed():
+            try:
+                for index, item in enumerate(items):
+                    while not in_flight.acquire(timeout=_POLL_SECONDS):
+                        if stop.is_set():
+                            return
+                    if not put(queues[0], PipelineResult(index, item, value=item)):
+                        return
+            except Exception as e:
+                feed_errors.append(e)
+            finally:
+                for _ in range(self.stages[0].workers):
+                    put(queues[0], _END)
+
+        def take(position, limit):
+            """Blocks for one queued result, then takes up to ``limit`` - 1 more that are ready."""
+            while not stop.is_set():
+                try:
+                    batch = [queues[position].get(timeout=_POLL_SECONDS)]
+                    break
+                except queue.Empty:
+                    continue
+            else:
+                return [], True
+            while len(batch) < limit and batch[-1] is not _END:
+                try:
+                    batch.append(queues[position].get_nowait())
+                except queue.Empty:
+                    break
+            ended = batch[-1] is _END
+            return (batch[:-1] if ended else batch), ended
+
+        def work(position, remaining_workers):
+            stage = self.stages[position]
+            is_last = position == len(self.stages) - 1
+            ended = False
+            while not ended and not stop.is_set():
+                batch, ended = take(position, stage.batch_size)
+                if not batch:
+                    continue
+                try:
+                    if stage.batch_size > 1:
+                        values = stage.func([result.value for result in batch])
+                    else:
+                        values = [stage.func(batch[0].value)]
+                except Exception as e:
+                    for result in batch:
+                        result.value, result.error, result.failed_stage = None, e, stage.name
+                        results.put(result)
+                    continue
+                for result, value in zip(batch, values):
+                    result.value = value
+                    if is_last:
+                        results.put(result)
+                    elif not put(queues[position + 1], result):
+                        return
+            if stop.is_set():
+                return
+
+            # The last worker of a stage to finish closes the next stage's queue
+            with remaining_workers["lock"]:
+                remaining_workers["count"] -= 1
+                finished = remaining_workers["count"] == 0
+            if finished:
+                if is_last:
+                    results.put(_END)
+                else:
+                    for _ in range(self.stages[position + 1].workers):
+                        put(queues[position + 1], _END)
+
+        threads = [threading.Thread(target=feed, name="pipeline-feed", daemon=True)]
+        for position, stage in enumerate(self.stages):
+            remaining_workers = {"count": stage.workers, "lock": threading.Lock()}
+            threads.extend(
+                threading.Thread(target=work, args=(position, remaining_workers),
+                                 name=f"pipeline-{stage.name}-{number}", daemon=True)
+                for number in range(stage.workers)
+            )
+        for thread in threads:
+            thread.start()
+
+        try:
+            yield from self._collect(results, in_flight)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        if feed_errors:
+            raise feed_errors[0]
+
+    def _collect(self, results: queue.Queue, in_flight: threading.BoundedSemaphore) -> Iterator[PipelineResult]:
+        pending: List[Any] = []  # Heap of (index, result) waiting for earlier items
+        next_index = 0
+        while True:
+            result = results.get()
+            if result is _END:
+                break
+            if not self.ordered:
+                in_flight.release()
+                yield result
+                continue
+
+            heapq.heappush(pending, (result.index, result))
+            while pending and pending[0][0] == next_index:
+                in_flight.release()
+                next_index += 1
+                yield heapq.heappop(pending)[1]
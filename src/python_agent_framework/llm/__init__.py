@@ -1,3 +1,4 @@
 # llm/__init__.py
 
-from .chat_completion import ChatCompletionHandler
\ No newline at end of file
+from .chat_completion import ChatCompletionHandler, get_chat_handler
+from .streaming import StreamEvent
\ No newline at end of file
@@ -1,31 +1,116 @@
 # llm/chat_completion.py
 
+import asyncio
+import functools
 import os
+import threading
+import weakref
 from dotenv import load_dotenv
-from typing import Any, Dict, List, Optional
-from httpcore import URL
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 from tenacity import retry, wait_random_exponential, stop_after_attempt
-from openai import OpenAI
+from utilities.lazy_imports import lazy_import
+from llm.response_cache import ResponseCache, get_response_cache, make_key
+from llm.streaming import StreamAssembler, StreamEvent, events_from_response
 import logging
 
 
-logging.getLogger("httpx").setLevel(logging.WARNING) 
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+openai = lazy_import("openai")
+
+DEFAULT_BASE_URL = 'https://api.openai.com/v1/'
+
+# Process-wide clients, one per (base_url, api_key); each keeps a keep-alive HTTP connection pool
+_CLIENTS: Dict[Tuple[str, str], Any] = {}
+# Async clients are bound to the event loop they were created on: loop -> {(base_url, api_key): client}
+_ASYNC_CLIENTS = weakref.WeakKeyDictionary()
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_client(base_url: str, api_key: str):
+    """Returns the shared ``OpenAI`` client for ``base_url`` and ``api_key``."""
+    key = (base_url, api_key)
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _CLIENTS[key] = openai.OpenAI(api_key=api_key, base_url=base_url)
+        return client
+
+
+def get_async_client(base_url: str, api_key: str):
+    """Returns the ``AsyncOpenAI`` client for ``base_url`` and ``api_key`` shared by the running event loop."""
+    loop = asyncio.get_running_loop()
+    key = (base_url, api_key)
+    with _CLIENTS_LOCK:
+        clients = _ASYNC_CLIENTS.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = openai.AsyncOpenAI(api_key=api_key, base_url=base_url)
+        return client
+
+
+def _forget_clients_after_fork():
+    """Drops the parent's clients in a forked child; their pooled sockets belong to the parent."""
+    global _CLIENTS_LOCK
+    _CLIENTS_LOCK = threading.Lock()
+    _CLIENTS.clear()
+    _ASYNC_CLIENTS.clear()
+    get_chat_handler.cache_clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_clients_after_fork)
 
 
 class ChatCompletionHandler:
     """
     Handles chat completion requests to OpenAI.
+
+    Handlers share their HTTP clients: every handler for the same base URL
+    and API key uses one process-wide client (and one per event loop for
+    async requests), so connections are pooled and kept alive across
+    conversations.
+
+    With a response cache (see llm/response_cache.py, enabled through
+    LLM_CACHE_MODE) identical requests are answered from recorded responses;
+    in replay mode a request without a recording raises CacheMissError
+    instead of reaching the network.
+
+    The ``stream_*`` variants yield StreamEvents: content deltas as they
+    arrive, each tool call once its arguments are complete, and finally the
+    assembled response.
     """
 
-    def __init__(self, base_url: str = 'https://api.openai.com/v1/', api_key: str = None, model: str = "gpt-3.5-turbo"):
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, api_key: str = None, model: str = "gpt-3.5-turbo",
+                 cache: Optional[ResponseCache] = None):
         if not api_key:
             load_dotenv()
             api_key = os.getenv("OPENAI_API_KEY")
-        
-        self.client = OpenAI(api_key = api_key, base_url = base_url)
+
+        self.base_url = base_url
+        self.api_key = api_key
         self.model = model
+        self.cache = cache if cache is not None else get_response_cache()
+
+    @property
+    def client(self):
+        """Shared synchronous client."""
+        return get_client(self.base_url, self.api_key)
+
+    def _cached_response(self, messages, tools, tool_choice):
+        """Returns (cache_key, recorded response or None); the key is None without a cache."""
+        if self.cache is None:
+            return None, None
+        cache_key = make_key(self.model, messages, tools, tool_choice)
+        cached = self.cache.get(cache_key)  # Raises CacheMissError on a miss in replay mode
+        if cached is None:
+            return cache_key, None
+        return cache_key, openai.types.chat.ChatCompletion.model_validate(cached)
+
+    def _record_response(self, cache_key, response):
+        if cache_key is not None:
+            self.cache.put(cache_key, response.model_dump(mode="json"), model=self.model)
 
-    @retry(wait=wait_random_exponential(multiplier=1, max=40), stop=stop_after_attempt(3))
     def chat_completion_request(
         self,
         messages: List[Dict[str, Any]],
@@ -40,6 +125,43 @@ class ChatCompletionHandler:
         :param tool_choice: Specific tool choice if needed.
         :return: OpenAI API response.
         """
+        cache_key, cached = self._cached_response(messages, tools, tool_choice)
+        if cached is not None:
+            return cached
+        response = self._create(messages, tools, tool_choice)
+        self._record_response(cache_key, response)
+        return response
+
+    def stream_chat_completion_request(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: Optional[Any] = None,
+    ) -> Iterator[StreamEvent]:
+        """
+        Streaming counterpart of chat_completion_request.
+
+        Only opening the stream is retried; a stream that breaks off midway raises.
+
+        :param messages: List of messages in the conversation.
+        :param tools: List of tools to provide to the assistant.
+        :param tool_choice: Specific tool choice if needed.
+        :return: Iterator of StreamEvents ending with a "done" event carrying the full response.
+        """
+        cache_key, cached = self._cached_response(messages, tools, tool_choice)
+        if cached is not None:
+            yield from events_from_response(cached)
+            return
+
+        assembler = StreamAssembler(self.model)
+        for chunk in self._create(messages, tools, tool_choice, stream=True):
+            yield from assembler.add(chunk)
+        events = assembler.finish()
+        self._record_response(cache_key, events[-1].response)
+        yield from events
+
+    @retry(wait=wait_random_exponential(multiplier=1, max=40), stop=stop_after_attempt(3))
+    def _create(self, messages, tools, tool_choice, stream=False):
         try:
 
             response = self.client.chat.completions.create(
@@ -47,9 +169,84 @@ class ChatCompletionHandler:
                 messages=messages,
                 tools=tools,
                 tool_choice=tool_choice,
+                stream=stream,
             )
             return response
         except Exception as e:
             print("Unable to generate ChatCompletion response")
             print(f"Exception: {e}")
-            raise e  # Let tenacity handle the retry
\ No newline at end of file
+            raise e  # Let tenacity handle the retry
+
+    async def achat_completion_request(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: Optional[Any] = None,
+    ) -> Any:
+        """
+        Async counterpart of chat_completion_request; does not block the event loop.
+
+        Retries (and their backoff sleeps) are awaited, so other coroutines keep running meanwhile.
+
+        :param messages: List of messages in the conversation.
+        :param tools: List of tools to provide to the assistant.
+        :param tool_choice: Specific tool choice if needed.
+        :return: OpenAI API response.
+        """
+        cache_key, cached = self._cached_response(messages, tools, tool_choice)
+        if cached is not None:
+            return cached
+        response = await self._acreate(messages, tools, tool_choice)
+        self._record_response(cache_key, response)
+        return response
+
+    async def astream_chat_completion_request(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: Optional[Any] = None,
+    ) -> AsyncIterator[StreamEvent]:
+        """
+        Async streaming counterpart of chat_completion_request.
+
+        :param messages: List of messages in the conversation.
+        :param tools: List of tools to provide to the assistant.
+        :param tool_choice: Specific tool choice if needed.
+        :return: Async iterator of StreamEvents ending with a "done" event carrying the full response.
+        """
+        cache_key, cached = self._cached_response(messages, tools, tool_choice)
+        if cached is not None:
+            for event in events_from_response(cached):
+                yield event
+            return
+
+        assembler = StreamAssembler(self.model)
+        async for chunk in await self._acreate(messages, tools, tool_choice, stream=True):
+            for event in assembler.add(chunk):
+                yield event
+        events = assembler.finish()
+        self._record_response(cache_key, events[-1].response)
+        for event in events:
+            yield event
+
+    @retry(wait=wait_random_exponential(multiplier=1, max=40), stop=stop_after_attempt(3))
+    async def _acreate(self, messages, tools, tool_choice, stream=False):
+        try:
+            return await get_async_client(self.base_url, self.api_key).chat.completions.create(
+                model=self.model,
+                messages=messages,
+                tools=tools,
+                tool_choice=tool_choice,
+                stream=stream,
+            )
+        except Exception as e:
+            print("Unable to generate ChatCompletion response")
+            print(f"Exception: {e}")
+            raise e  # Let tenacity handle the retry
+
+
+@functools.lru_cache(maxsize=None)
+def get_chat_handler(base_url: str = DEFAULT_BASE_URL, api_key: str = None,
+                     model: str = "gpt-3.5-turbo") -> ChatCompletionHandler:
+    """Returns the process-wide ChatCompletionHandler for (base_url, api_key, model)."""
+    return ChatCompletionHandler(base_url=base_url, api_key=api_key, model=model)
@@ -0,0 +1,254 @@
+# llm/response_cache.py
+
+import dataclasses
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from components.connections.database import get_connection, transaction
+
+# "off" (default), "readwrite" (serve hits, store misses) or "replay" (serve hits, fail on misses)
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "off").lower()
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "src/python_agent_framework/llm_cache.db")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 0))  # 0 keeps entries until evicted
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", 256))
+
+CACHE_MODES = ("off", "readwrite", "replay")
+
+
+class CacheMissError(LookupError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def _canonical(value: Any) -> Any:
+    """Converts messages, tool definitions and SDK objects into plain JSON values."""
+    if hasattr(value, "model_dump"):  # pydantic objects, e.g. the assistant messages kept in Memory
+        return _canonical(value.model_dump(mode="json", exclude_none=True))
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return _canonical(dataclasses.asdict(value))
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items() if item is not None}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def make_key(model: str, messages: List[Any], tools: Optional[List[Any]] = None, tool_choice: Any = None) -> str:
+    """
+    Canonical hash of a chat completion request.
+
+    Dictionary key order, None-valued fields and whether a message is a dict
+    or an SDK object do not change the key; anything that changes the
+    request the model sees does.
+    """
+    request = {
+        "model": model,
+        "messages": _canonical(messages),
+        "tools": _canonical(tools) if tools else None,
+        "tool_choice": _canonical(tool_choice),
+    }
+    encoded = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache of chat completion responses.
+
+    Lookups go to an in-memory LRU of ``memory_entries`` responses first and
+    then to a SQLite table. Entries older than ``ttl`` seconds (when set) are
+    treated as misses and removed; when the stored payloads exceed
+    ``max_bytes`` the least recently used entries are evicted. With
+    ``replay_only`` set, ``get`` raises CacheMissError instead of returning
+    None, so a run can be checked to never reach the network.
+    """
+
+    def __init__(self, db_path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL_SECONDS, max_bytes=LLM_CACHE_MAX_BYTES,
+                 memory_entries=LLM_CACHE_MEMORY_ENTRIES, replay_only=False):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.replay_only = replay_only
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()  # cache_key -> (payload, created_at)
+        self._lock = threading.Lock()
+
+        with transaction(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    model TEXT,
+                    payload TEXT,  -- JSON String of the response
+                    size_bytes INTEGER,
+                    created_at REAL,
+                    last_used REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_response_cache (last_used)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_response_cache (created_at)")
+
+    def _expired(self, created_at, now):
+        return bool(self.ttl) and created_at < now - self.ttl
+
+    def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the recorded response for ``cache_key``.
+
+        :return: The response as a JSON-compatible dictionary, or None on a miss.
+        :raises CacheMissError: On a miss in replay-only mode.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(cache_key)
+            if entry is not None and self._expired(entry[1], now):
+                del self._memory[cache_key]
+                entry = None
+            if entry is not None:
+                self._memory.move_to_end(cache_key)
+                self.memory_hits += 1
+                return json.loads(entry[0])
+
+        with get_connection(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT payload, created_at FROM llm_response_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row and self._expired(row[1], now):
+                conn.execute("DELETE FROM llm_response_cache WHERE cache_key = ?", (cache_key,))
+                row = None
+            elif row:
+                conn.execute("UPDATE llm_response_cache SET last_used = ? WHERE cache_key = ?", (now, cache_key))
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.disk_hits += 1
+                self._remember(cache_key, row[0], row[1])
+
+        if row is None:
+            if self.replay_only:
+                raise CacheMissError(f"No recorded response for request {cache_key[:12]} in replay mode.")
+            return None
+        return json.loads(row[0])
+
+    def put(self, cache_key: str, response: Dict[str, Any], model: str = None):
+        """
+        Records a response (a JSON-compatible dictionary) and evicts old entries if the cache is full.
+
+        A response larger than ``max_bytes`` on its own is not recorded.
+        """
+        payload = json.dumps(response)
+        if len(payload) > self.max_bytes:
+            return
+        now = time.time()
+        with transaction(self.db_path) as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO llm_response_cache (cache_key, model, payload, size_bytes, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (cache_key, model, payload, len(payload), now, now))
+            evicted = self._evict(conn, now)
+        if cache_key not in evicted:  # Memory only holds entries that are also on disk
+            with self._lock:
+                self._remember(cache_key, payload, now)
+
+    def _remember(self, cache_key, payload, created_at):
+        """Adds an entry to the in-memory LRU (caller holds the lock)."""
+        self._memory[cache_key] = (payload, created_at)
+        self._memory.move_to_end(cache_key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, conn, now):
+        """
+        Deletes expired entries, then least recently used ones until the cache fits in ``max_bytes``.
+
+        :return: The keys evicted to make room.
+        """
+        evicted = 0
+        evicted_keys = set()
+        if self.ttl:
+            evicted += conn.execute(
+                "DELETE FROM llm_response_cache WHERE created_at < ?", (now - self.ttl,)
+            ).rowcount
+
+        total_bytes = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM llm_response_cache").fetchone()[0]
+        while total_bytes > self.max_bytes:
+            oldest = conn.execute(
+                "SELECT cache_key, size_bytes FROM llm_response_cache ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not oldest:
+                break
+            for cache_key, size_bytes in oldest:
+                if total_bytes <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM llm_response_cache WHERE cache_key = ?", (cache_key,))
+                with self._lock:
+                    self._memory.pop(cache_key, None)
+                total_bytes -= size_bytes
+                evicted_keys.add(cache_key)
+                evicted += 1
+
+        with self._lock:
+            self.evictions += evicted
+        return evicted_keys
+
+    def clear(self):
+        """Removes every recorded response."""
+        with transaction(self.db_path) as conn:
+            conn.execute("DELETE FROM llm_response_cache")
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self):
+        """Returns hit/miss counters and current cache size."""
+        with get_connection(self.db_path) as conn:
+            entries, total_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM llm_response_cache"
+            ).fetchone()
+
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": total_bytes,
+            }
+
+
+# One process-wide cache per mode, so a replay-only cache never changes a read-write one
+_caches: Dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(mode: str = None) -> Optional[ResponseCache]:
+    """
+    Returns the process-wide response cache for ``mode`` (defaults to LLM_CACHE_MODE).
+
+    :return: None when caching is off.
+    """
+    mode = (mode or LLM_CACHE_MODE).lower()
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown LLM cache mode '{mode}'; expected one of {', '.join(CACHE_MODES)}.")
+    if mode == "off":
+        return None
+
+    with _caches_lock:
+        if mode not in _caches:
+            _caches[mode] = ResponseCache(replay_only=mode == "replay")
+        return _caches[mode]
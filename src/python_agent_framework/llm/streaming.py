@@ -0,0 +1,117 @@
+# llm/streaming.py
+
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional
+from utilities.lazy_imports import lazy_import
+
+openai = lazy_import("openai")
+
+
+@dataclass
+class StreamEvent:
+    """One event of a streamed chat completion."""
+    type: str                     # "content", "tool_call" or "done"
+    content: Optional[str] = None  # Text delta of a "content" event
+    tool_call: Any = None          # Completed tool call of a "tool_call" event
+    response: Any = None           # Assembled ChatCompletion of the final "done" event
+
+
+def _tool_call(call: Dict[str, Any]):
+    """Builds an SDK tool call object (with ``.id`` and ``.function``) from an assembled dictionary."""
+    message = openai.types.chat.ChatCompletionMessage.model_validate(
+        {"role": "assistant", "content": None, "tool_calls": [call]}
+    )
+    return message.tool_calls[0]
+
+
+class StreamAssembler:
+    """
+    Assembles streamed chat completion chunks.
+
+    Content deltas are passed on as they arrive. Tool call fragments are
+    accumulated per call index; a call is reported as complete once a later
+    call starts or the choice finishes, so callers can start executing it
+    while the rest of the response is still streaming. ``finish`` returns the
+    remaining events and the full ChatCompletion, identical in shape to a
+    non-streamed response.
+    """
+
+    def __init__(self, model: str = None):
+        self.model = model
+        self.response_id = None
+        self.created = None
+        self.finish_reason = None
+        self._content: List[str] = []
+        self._tool_calls: Dict[int, Dict[str, Any]] = {}
+        self._emitted = set()
+
+    def add(self, chunk) -> List[StreamEvent]:
+        """Consumes one chunk and returns the events it completes."""
+        self.response_id = self.response_id or chunk.id
+        self.created = self.created or chunk.created
+        self.model = chunk.model or self.model
+
+        events = []
+        for choice in chunk.choices:
+            if choice.index != 0:
+                continue  # Only one choice is requested
+            delta = choice.delta
+            if delta.content:
+                self._content.append(delta.content)
+                events.append(StreamEvent("content", content=delta.content))
+
+            for fragment in delta.tool_calls or []:
+                # A new call index means every earlier call has been fully streamed
+                events.extend(self._complete_tool_calls(before=fragment.index))
+                call = self._tool_calls.setdefault(
+                    fragment.index, {"id": None, "type": "function", "function": {"name": "", "arguments": ""}}
+                )
+                if fragment.id:
+                    call["id"] = fragment.id
+                if fragment.function is not None:
+                    call["function"]["name"] += fragment.function.name or ""
+                    call["function"]["arguments"] += fragment.function.arguments or ""
+
+            if choice.finish_reason:
+                self.finish_reason = choice.finish_reason
+                events.extend(self._complete_tool_calls())
+        return events
+
+    def _complete_tool_calls(self, before: int = None) -> List[StreamEvent]:
+        events = []
+        for index in sorted(self._tool_calls):
+            if index in self._emitted or (before is not None and index >= before):
+                continue
+            self._emitted.add(index)
+            events.append(StreamEvent("tool_call", tool_call=_tool_call(self._tool_calls[index])))
+        return events
+
+    def finish(self) -> List[StreamEvent]:
+        """Returns the events for tool calls not yet reported and the final "done" event."""
+        events = self._complete_tool_calls()
+        events.append(StreamEvent("done", response=self.response()))
+        return events
+
+    def response(self):
+        """The streamed response assembled into a ChatCompletion."""
+        message = {"role": "assistant", "content": "".join(self._content) or None}
+        if self._tool_calls:
+            message["tool_calls"] = [self._tool_calls[index] for index in sorted(self._tool_calls)]
+        return openai.types.chat.ChatCompletion.model_validate({
+            "id": self.response_id or "stream",
+            "object": "chat.completion",
+            "created": self.created or int(time.time()),
+            "model": self.model or "",
+            "choices": [{"index": 0, "finish_reason": self.finish_reason or "stop", "message": message}],
+        })
+
+
+def events_from_response(response) -> Iterator[StreamEvent]:
+    """Replays a complete ChatCompletion (e.g. a cached one) as stream events."""
+    message = response.choices[0].message
+    if message.content:
+        yield StreamEvent("content", content=message.content)
+    for tool_call in message.tool_calls or []:
+        yield StreamEvent("tool_call", tool_call=tool_call)
+    yield StreamEvent("done", response=response)
@@ -1,11 +1,479 @@
+from dotenv import load_dotenv
+
+# Loaded first: module-level settings (SMTP_*, ERP_*, GEMINI_*, ...) are read when the components are imported
+load_dotenv()
+
 from components.agents.document_processor import DocumentProcessorAgent
 from components.agents.data_analysis import DataAnalysisAgent
 from components.agents.customer_interaction import CustomerInteractionAgent
 from components.agents.task_execution import TaskExecutionAgent
-from components.connections.database import fetch_invoice, init_db
+from components.connections.database import close_pools, fetch_invoice, init_db
+from utilities.invoice_sources import collect_invoice_paths
+from components.connections.job_queue import DONE, STAGES, JobQueue
+from components.connections.outbox import NotificationOutbox
+from core.pipeline import Pipeline, Stage
+from utilities.startup_profile import format_report, profile_startup
+import argparse
+import json
+import multiprocessing
 import os
+import queue
+import time
+
+# Worker threads per downstream stage in batch mode (extraction uses --concurrency)
+DEFAULT_STAGE_WORKERS = {"analyze": 2, "notify": 1, "execute": 1}
+
+# Pipeline items settled together by one TaskExecutionAgent.process_invoices call
+EXECUTE_BATCH_SIZE = 64
+
+# The batch report lists scheduled payments falling due within this many days
+PAYMENT_LOOKAHEAD_DAYS = 7
+
+
+def parse_args(argv=None):
+    """Parses command line options for interactive and batch modes."""
+    parser = argparse.ArgumentParser(description="Invoice Processing Assistant")
+    parser.add_argument(
+        "--batch",
+        metavar="SOURCE",
+        help="Process invoices non-interactively from a directory, glob pattern or manifest file.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum number of concurrent Gemini extractions in batch mode (default: 8).",
+    )
+    parser.add_argument(
+        "--summary",
+        default="batch_summary.jsonl",
+        help="Path of the per-invoice JSON Lines summary written in batch mode.",
+    )
+    parser.add_argument(
+        "--extraction-batch-size",
+        type=int,
+        default=1,
+        help="Invoice images packed into each Gemini request in batch mode (default: 1).",
+    )
+    parser.add_argument(
+        "--stage-workers",
+        action="append",
+        metavar="NAME=N",
+        help="Worker threads for a downstream batch stage (analyze, notify, execute); may be repeated.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes sharing the batch's job queue (default: 1); --concurrency applies per worker.",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore recorded batch progress for these invoices and process them from scratch.",
+    )
+    parser.add_argument(
+        "--ordered",
+        action="store_true",
+        help="Write batch summary lines in input order instead of completion order.",
+    )
+    parser.add_argument(
+        "--release-payments",
+        action="store_true",
+        help="Release the scheduled payments that have fallen due and exit; run it periodically (e.g. daily from cron).",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Report the import time of the assistant's modules and exit.",
+    )
+    args = parser.parse_args(argv)
+    try:
+        args.stage_workers = parse_stage_workers(args.stage_workers)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def summarize_invoice(invoice_path, extracted_data, analysis_results, elapsed):
+    """Builds the per-invoice summary record written in batch mode."""
+    summary = {"path": invoice_path, "elapsed_seconds": round(elapsed, 3)}
+
+    if "error" in extracted_data:
+        summary.update({"status": "extraction_failed", "error": extracted_data["error"]})
+        return summary
+
+    summary["invoice_id"] = extracted_data.get("Invoice_ID")
+    if analysis_results is None or "error" in analysis_results:
+        error = analysis_results["error"] if analysis_results else "Analysis did not run."
+        summary.update({"status": "analysis_failed", "error": error})
+        return summary
+
+    summary.update({
+        "status": "processed",
+        "valid": analysis_results["Validation"]["valid"],
+        "errors": analysis_results["Validation"]["errors"],
+        "fraud_detected": analysis_results["Fraud Detection"]["fraud_detected"],
+        "warnings": analysis_results["Fraud Detection"]["warnings"],
+    })
+    return summary
+
+
+def parse_stage_workers(specs):
+    """Parses ``--stage-workers NAME=N`` options into {stage name: workers}."""
+    counts = dict(DEFAULT_STAGE_WORKERS)
+    for spec in specs or []:
+        name, separator, value = spec.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_STAGE_WORKERS or not separator or not value.isdigit() or int(value) < 1:
+            raise ValueError(
+                f"Invalid stage worker count '{spec}'; expected NAME=N with NAME in "
+                f"{', '.join(DEFAULT_STAGE_WORKERS)} and N >= 1."
+            )
+        counts[name] = int(value)
+    return counts
+
+
+def run_batch(source, concurrency, summary_path, extraction_batch_size=1, stage_workers=None, ordered=False,
+              restart=False, workers=1):
+    """
+    Processes every invoice found in ``source`` without prompting.
+
+    Invoices flow through a pipeline of extraction, analysis, notification and
+    task execution stages connected by bounded queues, so extraction of one
+    chunk overlaps the downstream stages of earlier ones. ``concurrency``
+    extraction workers each send up to ``extraction_batch_size`` images per
+    Gemini request; ``stage_workers`` sets the other stages' worker counts.
+    One JSON line per invoice is written to ``summary_path`` once it is
+    finished, in input order when ``ordered`` is set.
+
+    Progress is recorded per invoice and stage in a durable job queue, so
+    running the same batch again after a crash resumes unfinished invoices
+    at the stage where they stopped and skips finished ones; ``restart``
+    discards that progress for ``source``. Summaries of invoices finished by
+    earlier runs are written again first, and the returned counts cover the
+    whole batch.
+
+    With ``workers`` > 1 the queue is drained by that many processes (each
+    with its own pipeline and ``concurrency`` extraction threads) and their
+    summaries and metrics are collected here; ``ordered`` then only applies
+    within each worker.
+    """
+    invoice_paths = collect_invoice_paths(source)
+    print(f"\n📦 Batch mode: {len(invoice_paths)} invoice(s) found in '{source}'.")
+    stage_workers = {**DEFAULT_STAGE_WORKERS, **(stage_workers or {})}
+
+    init_db()
+    job_queue = JobQueue()
+    if restart:
+        job_queue.reset(invoice_paths)
+    added = job_queue.enqueue(invoice_paths)
+    recovered = job_queue.recover_orphans()
+    if added < len(invoice_paths) or recovered:
+        print(
+            f"♻️ Resuming: {len(invoice_paths) - added} invoice(s) already queued, "
+            f"{recovered} job(s) recovered from a previous run."
+        )
+
+    batch_started = time.perf_counter()
+    written = set()
+
+    with open(summary_path, "w", encoding="utf-8") as summary_file:
+        def write_summary(summary):
+            # A job is finished once, but guard the file against a result reported twice
+            if summary["path"] not in written:
+                written.add(summary["path"])
+                summary_file.write(json.dumps(summary) + "\n")
+
+        for summary in job_queue.summaries(invoice_paths):
+            write_summary(summary)
+        finished_before = len(written)
+
+        if workers > 1:
+            cache_stats = run_worker_processes(
+                workers, write_summary, concurrency, extraction_batch_size, stage_workers, ordered
+            )
+        else:
+            cache_stats = process_jobs(
+                job_queue, concurrency, extraction_batch_size, stage_workers, ordered, write_summary,
+                flush=summary_file.flush,
+            )
+
+    elapsed = time.perf_counter() - batch_started
+    counts = {"processed": 0, "extraction_failed": 0, "analysis_failed": 0}
+    for summary in job_queue.summaries(invoice_paths):
+        counts[summary["status"]] += 1
+    finished_now = len(written) - finished_before
+    print(
+        f"\n🏁 Batch complete in {elapsed:.1f}s: {counts['processed']} processed, "
+        f"{counts['extraction_failed']} failed extraction, {counts['analysis_failed']} failed analysis"
+        f" ({finished_now} in this run, {finished_now / elapsed if elapsed else 0:.1f} invoices/s)."
+    )
+    print(f"🧾 Summary written to {summary_path}")
+
+    queue_counts = job_queue.counts()
+    if queue_counts.get("pending") or queue_counts.get("running"):
+        print(
+            f"⏳ {queue_counts.get('pending', 0)} job(s) left to retry and {queue_counts.get('running', 0)} "
+            f"still leased; run the batch again to resume them."
+        )
+
+    if cache_stats:
+        print(
+            f"🗃️ Extraction cache: {cache_stats['hits']} hit(s), {cache_stats['misses']} miss(es) "
+            f"({cache_stats['hit_rate']:.0%} hit rate), {cache_stats['entries']} entries."
+        )
+
+    # Payments also fall due on days when no invoice gets approved
+    release_payments()
+    return counts
+
+
+def release_payments():
+    """
+    Releases every scheduled payment that has fallen due and lists those coming up.
+
+    Processing an invoice releases due payments as a side effect; this entry
+    point (``--release-payments``, also run after each batch) releases them
+    when no invoices are being processed.
+
+    :return: Number of payments released.
+    """
+    init_db()
+    task_executor = TaskExecutionAgent()
+    released = task_executor.release_due_payments()
+    print(f"💸 Released {released} due payment(s)." if released else "💸 No scheduled payments are due.")
+
+    upcoming = task_executor.upcoming_payments(PAYMENT_LOOKAHEAD_DAYS)
+    if upcoming:
+        print(
+            f"🗓️ {len(upcoming)} scheduled payment(s) totalling ${sum(payment['amount'] or 0 for payment in upcoming):,.2f} "
+            f"due in the next {PAYMENT_LOOKAHEAD_DAYS} days."
+        )
+    return released
 
-def main():
+
+def process_jobs(job_queue, concurrency, extraction_batch_size, stage_workers, ordered, emit, flush=None):
+    """
+    Claims jobs from ``job_queue`` and runs them through the stage pipeline until none are left.
+
+    ``emit`` receives one summary dictionary per finished invoice, which is
+    also stored with its job (``flush`` is called after each pipeline
+    result); attempts that will be retried are not reported. Notifications are coalesced into
+    per-recipient digests through the outbox. Returns the extraction cache
+    statistics.
+    """
+    doc_processor = DocumentProcessorAgent()
+    data_analyst = DataAnalysisAgent()
+    outbox = NotificationOutbox()
+    customer_interaction = CustomerInteractionAgent(outbox=outbox)
+    task_executor = TaskExecutionAgent()
+
+    def is_failed(record):
+        return "error" in record["extracted"] or (record["analysis"] is not None and "error" in record["analysis"])
+
+    def extract(jobs):
+        started = time.perf_counter()
+        # Resumed jobs skip the stages they already finished
+        records = [
+            {"job": job, "path": job.path, "extracted": {"Invoice_ID": job.invoice_id}, "analysis": job.result,
+             "started": started, "retrying": False, "lost": False}
+            for job in jobs
+        ]
+        pending = [record for record in records if record["job"].stage == "extract"]
+        if not pending:
+            return records
+
+        try:
+            if len(pending) == 1:
+                extracted = [doc_processor.process_invoice(pending[0]["path"])]
+            else:
+                extracted = doc_processor.extract_invoice_batch(
+                    [record["path"] for record in pending], batch_size=len(pending)
+                )
+        except Exception as e:
+            extracted = [{"error": f"Failed to extract invoice data: {str(e)}"}] * len(pending)
+
+        for record, extracted_data in zip(pending, extracted):
+            record["extracted"] = extracted_data
+            if "error" in extracted_data:
+                record["retrying"] = job_queue.fail(record["job"], extracted_data["error"])
+            elif not job_queue.advance(record["job"], "analyze", invoice_id=extracted_data["Invoice_ID"]):
+                record.update({"extracted": {"error": "Job was claimed by another worker."}, "lost": True})
+        return records
+
+    def run_stage(records, stage, action):
+        """Runs ``action`` for records whose job is at ``stage`` and commits the job's progress."""
+        next_stage = STAGES[STAGES.index(stage) + 1] if stage != STAGES[-1] else DONE
+        for record in records:
+            job = record["job"]
+            if is_failed(record) or job.stage != stage:
+                continue
+            try:
+                action(record)
+            except Exception as e:
+                record["analysis"] = {"error": f"Failed to process invoice: {str(e)}"}
+            record_progress(record, next_stage)
+        return records
+
+    def record_progress(record, next_stage):
+        if is_failed(record):
+            record["retrying"] = job_queue.fail(record["job"], record["analysis"]["error"])
+        elif not job_queue.advance(record["job"], next_stage, result=record["analysis"]):
+            record.update({"analysis": {"error": "Job was claimed by another worker."}, "lost": True})
+
+    def analyze(record):
+        record["analysis"] = data_analyst.analyze_invoice(record["extracted"]["Invoice_ID"])
+
+    def notify(record):
+        customer_interaction.handle_invoice_communication(
+            record["extracted"]["Invoice_ID"],
+            record["analysis"]["Validation"],
+            record["analysis"]["Fraud Detection"],
+            # Freshly extracted invoices already carry the fields the vendor email needs
+            invoice_data=record["extracted"] if "Vendor" in record["extracted"] else None,
+        )
+
+    def execute(batch):
+        """Settles every ready invoice of a micro-batch with one status transaction and bulk ERP sync."""
+        ready = [
+            record for records in batch for record in records
+            if not is_failed(record) and record["job"].stage == "execute"
+        ]
+        if ready:
+            try:
+                task_executor.process_invoices(
+                    (record["extracted"]["Invoice_ID"], record["analysis"]["Fraud Detection"]["fraud_detected"])
+                    for record in ready
+                )
+            except Exception as e:
+                for record in ready:
+                    record["analysis"] = {"error": f"Failed to process invoice: {str(e)}"}
+            for record in ready:
+                record_progress(record, DONE)
+        return batch
+
+    pipeline = Pipeline([
+        Stage("extract", extract, workers=concurrency),
+        Stage("analyze", lambda records: run_stage(records, "analyze", analyze), workers=stage_workers["analyze"]),
+        Stage("notify", lambda records: run_stage(records, "notify", notify), workers=stage_workers["notify"]),
+        Stage("execute", execute, workers=stage_workers["execute"], batch_size=EXECUTE_BATCH_SIZE),
+    ], ordered=ordered)
+
+    def claimed_jobs():
+        # Claimed lazily: the pipeline only pulls more work when it has room for it
+        while True:
+            jobs = job_queue.claim(extraction_batch_size)
+            if not jobs:
+                return
+            yield jobs
+
+    try:
+        for result in pipeline.run(claimed_jobs()):
+            records = result.value
+            if not result.ok:
+                # Stage functions handle their own errors; this only guards against bugs in them
+                error = f"{result.failed_stage} stage failed: {result.error}"
+                records = [
+                    {"job": job, "path": job.path, "extracted": {"error": error}, "analysis": None,
+                     "started": time.perf_counter(), "retrying": job_queue.fail(job, error), "lost": False}
+                    for job in result.item
+                ]
+            # Retried jobs and jobs taken over by another worker are reported by whoever finishes them
+            finished = []
+            for record in records:
+                if record["retrying"] or record["lost"]:
+                    continue
+                summary = summarize_invoice(
+                    record["path"], record["extracted"], record["analysis"], time.perf_counter() - record["started"]
+                )
+                summary["attempt"] = record["job"].attempts
+                finished.append((record["job"], summary))
+            if finished:
+                job_queue.record_summaries(finished)
+            for _, summary in finished:
+                emit(summary)
+            if flush:
+                flush()
+    finally:
+        outbox.close()  # Sends every digest still queued
+
+    if outbox.messages_sent:
+        print(f"📨 Sent {outbox.messages_sent} notification(s) in {outbox.digests_sent} email(s).")
+    return doc_processor.cache_stats()
+
+
+def batch_worker(concurrency, extraction_batch_size, stage_workers, ordered, results):
+    """Entry point of a ``--workers`` process: drains the shared job queue and reports to the parent."""
+    worker = os.getpid()
+
+    def emit(summary):
+        summary["worker"] = worker
+        results.put(("summary", summary))
+
+    try:
+        cache_stats = process_jobs(JobQueue(), concurrency, extraction_batch_size, stage_workers, ordered, emit)
+    finally:
+        close_pools()  # Checkpoint this process's WAL before reporting completion
+    results.put(("done", {"worker": worker, "cache_stats": cache_stats}))
+
+
+def run_worker_processes(workers, emit, concurrency, extraction_batch_size, stage_workers, ordered):
+    """
+    Starts ``workers`` batch_worker processes and collects their summaries as they arrive.
+
+    Workers coordinate only through the job queue's leases. A worker that
+    dies leaves its jobs leased; they are recovered on the next run.
+    Returns the workers' combined extraction cache statistics.
+    """
+    # Forked children start with fresh connection pools (see database.get_pool)
+    context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=batch_worker, name=f"invoice-worker-{number}",
+            args=(concurrency, extraction_batch_size, stage_workers, ordered, results),
+        )
+        for number in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    print(f"👷 Started {workers} worker process(es).")
+
+    finished = set()
+    cache_stats = None
+    while len(finished) < len(processes):
+        try:
+            kind, payload = results.get(timeout=1.0)
+        except queue.Empty:
+            for process in processes:
+                if not process.is_alive() and process.pid not in finished:
+                    finished.add(process.pid)
+                    print(f"⚠️ Worker {process.pid} exited with code {process.exitcode} before finishing.")
+            continue
+
+        if kind == "summary":
+            emit(payload)
+        else:
+            finished.add(payload["worker"])
+            worker_stats = payload["cache_stats"]
+            if worker_stats:
+                cache_stats = cache_stats or {"hits": 0, "misses": 0, "entries": 0}
+                cache_stats["hits"] += worker_stats["hits"]
+                cache_stats["misses"] += worker_stats["misses"]
+                cache_stats["entries"] = max(cache_stats["entries"], worker_stats["entries"])
+
+    for process in processes:
+        process.join()
+
+    if cache_stats:
+        lookups = cache_stats["hits"] + cache_stats["misses"]
+        cache_stats["hit_rate"] = cache_stats["hits"] / lookups if lookups else 0.0
+    return cache_stats
+
+
+def run_interactive():
+    """Prompts for invoice paths one at a time."""
     print("\n🤖 Hello! I'm your Invoice Processing Assistant.")
 
     # Initialize database
@@ -75,5 +543,22 @@ def main():
         print("\n🗄️ Invoice Retrieved from Database:")
         print(stored_invoice)
 
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile_startup:
+        print(format_report(profile_startup()))
+    elif args.release_payments:
+        release_payments()
+    elif args.batch:
+        run_batch(
+            args.batch, max(1, args.concurrency), args.summary, max(1, args.extraction_batch_size),
+            stage_workers=args.stage_workers, ordered=args.ordered, restart=args.restart,
+            workers=max(1, args.workers),
+        )
+    else:
+        run_interactive()
+
+
 if __name__ == "__main__":
     main()
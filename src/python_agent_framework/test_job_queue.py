@@ -0,0 +1,72 @@
+from components.connections.job_queue import DONE, JobQueue
+import os
+import tempfile
+import time
+
+work_dir = tempfile.mkdtemp(prefix="job_queue_test_")
+db_path = os.path.join(work_dir, "jobs.db")
+
+def write_invoice(name, content):
+    path = os.path.join(work_dir, name)
+    with open(path, "w") as invoice_file:
+        invoice_file.write(content)
+    return path
+
+first = write_invoice("first.jpg", "first invoice")
+second = write_invoice("second.jpg", "second invoice")
+
+worker_a = JobQueue(db_path, lease_seconds=0.2, max_attempts=2, owner="host:worker-a")
+worker_b = JobQueue(db_path, lease_seconds=0.2, max_attempts=2, owner="host:worker-b")
+
+print("\n🚀 Running Job Queue Test...\n")
+
+print("🔹 Case 1: One job per file, however it is reached")
+relative_first = os.path.relpath(os.path.join(work_dir, ".", "first.jpg"))
+added = worker_a.enqueue([first, second, relative_first])
+print("added", added, worker_a.counts())
+assert added == 2
+assert worker_a.enqueue([first]) == 0
+
+print("\n🔹 Case 2: Claimed jobs are leased to one worker")
+jobs = worker_a.claim(limit=1)
+assert [job.path for job in jobs] == [os.path.realpath(first)] and jobs[0].stage == "extract"
+assert jobs[0].attempts == 1
+other = worker_b.claim(limit=5)
+print("worker b claimed", [job.path for job in other])
+assert [job.path for job in other] == [os.path.realpath(second)]
+assert worker_b.claim(limit=5) == []
+assert worker_b.fail(other[0], "temporary error"), "first attempt of two is retried"
+assert worker_b.counts() == {"running": 1, "pending": 1}
+
+print("\n🔹 Case 3: Stage checkpoints survive an expired lease")
+job = jobs[0]
+assert worker_a.advance(job, "analyze", invoice_id="INV-1")
+time.sleep(0.3)  # Worker a stalls past its lease
+resumed = worker_b.claim(limit=5)
+print("resumed", [(job.path, job.stage, job.invoice_id, job.attempts) for job in resumed])
+resumed_first = [job for job in resumed if job.path == os.path.realpath(first)][0]
+assert resumed_first.stage == "analyze" and resumed_first.invoice_id == "INV-1" and resumed_first.attempts == 2
+assert not worker_a.advance(job, "notify"), "a worker that lost its lease must not record progress"
+assert worker_a.fail(job, "late error"), "a lost lease is not a final failure"
+
+print("\n🔹 Case 4: Finished jobs keep their summary")
+assert worker_b.advance(resumed_first, "notify", result={"Validation": {"valid": True}})
+assert worker_b.advance(resumed_first, DONE)
+worker_b.record_summaries([(resumed_first, {"path": resumed_first.path, "status": "processed"})])
+print(worker_b.summaries([relative_first, second]))
+assert worker_b.summaries([relative_first, second]) == [{"path": os.path.realpath(first), "status": "processed"}]
+
+print("\n🔹 Case 5: A job fails for good once its attempts run out")
+second_job = [job for job in resumed if job.path == os.path.realpath(second)][0]
+assert not worker_b.fail(second_job, "extraction failed"), "second attempt of two is final"
+print(worker_b.counts())
+assert worker_b.counts() == {"done": 1, "failed": 1}
+assert worker_b.claim(limit=5) == []
+
+print("\n🔹 Case 6: A file replaced under the same name is a new job")
+time.sleep(0.01)
+write_invoice("first.jpg", "a different invoice under a reused name")
+assert worker_a.enqueue([first]) == 1
+assert [job.stage for job in worker_a.claim(limit=5)] == ["extract"]
+
+print("\n✅ Job queue tests passed.")
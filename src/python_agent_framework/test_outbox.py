@@ -0,0 +1,65 @@
+from components.connections.mail import FileTransport
+from components.connections.outbox import NotificationOutbox, compose_digest
+import mailbox
+import os
+import tempfile
+
+work_dir = tempfile.mkdtemp(prefix="outbox_test_")
+db_path = os.path.join(work_dir, "outbox.db")
+mbox_path = os.path.join(work_dir, "sent.mbox")
+
+def delivered():
+    """(recipient, subject, body) of every email in the mbox, in delivery order."""
+    sink = mailbox.mbox(mbox_path)
+    try:
+        return [
+            (message["To"], message["Subject"], message.get_payload(decode=True).decode("utf-8"))
+            for message in sink
+        ]
+    finally:
+        sink.close()
+
+class FailingTransport:
+    def send(self, recipient, subject, body):
+        raise ConnectionError("mail server unavailable")
+
+    def close(self):
+        pass
+
+print("\n🚀 Running Notification Outbox Test...\n")
+
+print("🔹 Case 1: Composing digests")
+assert compose_digest([("Invoice Approved", "one")]) == ("Invoice Approved", "one")
+subject, body = compose_digest([("Invoice Approved", "one"), ("Invoice Approved", "two")])
+print(subject)
+assert subject == "Invoice Approved (2 invoices)" and "one" in body and "two" in body
+assert compose_digest([("Invoice Approved", "one"), ("Invoice Flagged", "two")])[0] == "2 Invoice Notifications"
+
+print("\n🔹 Case 2: Only full digests are sent before the wait is over")
+outbox = NotificationOutbox(FileTransport(mbox_path), db_path, max_messages=3, max_wait=3600, autostart=False)
+for number in range(4):
+    outbox.add("alice@example.com", "Invoice Approved", f"Invoice A-{number} was approved.")
+outbox.add("bob@example.com", "Invoice Flagged", "Invoice B-0 was flagged.")
+sent = outbox.flush()
+print("digests sent", sent, delivered())
+assert sent == 2  # Alice's four messages, split at max_messages
+assert [recipient for recipient, _, _ in delivered()] == ["alice@example.com"] * 2
+assert delivered()[0][1] == "Invoice Approved (3 invoices)"
+assert all(f"A-{number}" in "".join(body for _, _, body in delivered()) for number in range(4))
+assert outbox.pending() == 1
+
+print("\n🔹 Case 3: Closing the outbox sends everything still queued")
+outbox.close()
+print(delivered()[-1])
+assert delivered()[-1] == ("bob@example.com", "Invoice Flagged", "Invoice B-0 was flagged.")
+assert outbox.pending() == 0 and outbox.digests_sent == 3 and outbox.messages_sent == 5
+
+print("\n🔹 Case 4: Failed digests stay queued for the next flush")
+failing = NotificationOutbox(FailingTransport(), db_path, max_messages=3, max_wait=3600, autostart=False)
+failing.add("carol@example.com", "Invoice Approved", "Invoice C-0 was approved.")
+assert failing.flush(force=True) == 0 and failing.pending() == 1
+retry = NotificationOutbox(FileTransport(mbox_path), db_path, max_messages=3, max_wait=3600, autostart=False)
+assert retry.flush(force=True) == 1 and retry.pending() == 0
+assert delivered()[-1][0] == "carol@example.com"
+
+print("\n✅ Notification outbox tests passed.")
@@ -0,0 +1,65 @@
+from core.pipeline import Pipeline, Stage
+import threading
+import time
+
+# Later items finish their first stage sooner, so completion order differs from input order
+def slow_for_early_items(item):
+    time.sleep(0.01 * (5 - item))
+    return item * 10
+
+def add_one(value):
+    return value + 1
+
+def fail_on_thirty(value):
+    if value == 30:
+        raise ValueError("bad item")
+    return value
+
+later_stage_calls = []
+calls_lock = threading.Lock()
+
+def record_call(value):
+    with calls_lock:
+        later_stage_calls.append(value)
+    return value
+
+print("\n🚀 Running Pipeline Test...\n")
+
+print("🔹 Case 1: Unordered output (results as items finish)")
+pipeline = Pipeline([Stage("slow", slow_for_early_items, workers=5), Stage("add", add_one, workers=2)])
+results = list(pipeline.run(range(5)))
+print([(result.index, result.value) for result in results])
+assert sorted(result.value for result in results) == [1, 11, 21, 31, 41]
+assert all(result.ok for result in results)
+assert [result.index for result in results] != [0, 1, 2, 3, 4], "expected completion order to differ from input order"
+
+print("\n🔹 Case 2: Ordered output (results in input order)")
+pipeline = Pipeline([Stage("slow", slow_for_early_items, workers=5), Stage("add", add_one, workers=2)], ordered=True)
+results = list(pipeline.run(range(5)))
+print([(result.index, result.value) for result in results])
+assert [result.index for result in results] == [0, 1, 2, 3, 4]
+assert [result.value for result in results] == [1, 11, 21, 31, 41]
+
+print("\n🔹 Case 3: Error in a stage ends only that item")
+pipeline = Pipeline([
+    Stage("multiply", lambda item: item * 10),
+    Stage("check", fail_on_thirty, workers=2),
+    Stage("record", record_call),
+], ordered=True)
+results = list(pipeline.run(range(5)))
+for result in results:
+    print(result.index, result.ok, result.failed_stage, result.error)
+failed = [result for result in results if not result.ok]
+assert len(results) == 5
+assert [result.index for result in failed] == [3]
+assert failed[0].failed_stage == "check" and isinstance(failed[0].error, ValueError)
+assert failed[0].item == 3 and failed[0].value is None
+assert 30 not in later_stage_calls and sorted(later_stage_calls) == [0, 10, 20, 40]
+
+print("\n🔹 Case 4: Error in a batched stage fails every item of that batch")
+pipeline = Pipeline([Stage("sum", lambda values: 1 / 0, batch_size=4)])
+results = list(pipeline.run(range(3)))
+assert len(results) == 3 and all(result.failed_stage == "sum" for result in results)
+print([(result.index, type(result.error).__name__) for result in results])
+
+print("\n✅ Pipeline tests passed.")
@@ -0,0 +1,71 @@
+import os
+import tempfile
+
+# Point the database at a scratch file before the connection module reads INVOICE_DB_PATH
+work_dir = tempfile.mkdtemp(prefix="task_execution_test_")
+os.environ["INVOICE_DB_PATH"] = os.path.join(work_dir, "invoices.db")
+
+from datetime import date, timedelta
+from components.agents.task_execution import TaskExecutionAgent
+from components.connections.database import get_connection, init_db, save_invoices
+from components.connections.erp import ERPClient, MockERPServer
+from components.connections.payments import PaymentScheduler
+
+yesterday = (date.today() - timedelta(days=1)).isoformat()
+next_month = (date.today() + timedelta(days=30)).isoformat()
+
+def invoice(invoice_id, due_date):
+    return {"Invoice_ID": invoice_id, "Vendor": "ABC Supplies", "Total_Amount": 100.0, "Tax": 5.0,
+            "Due_Date": due_date, "Line_Items": [{"Item": "Laptop", "Quantity": 1, "Price": 95.0}]}
+
+def statuses():
+    with get_connection() as conn:
+        return dict(conn.execute("SELECT invoice_id, status FROM invoices").fetchall())
+
+def payments():
+    with get_connection() as conn:
+        return dict(conn.execute("SELECT invoice_id, status FROM payments").fetchall())
+
+init_db()
+save_invoices([invoice("INV-1", yesterday), invoice("INV-2", next_month), invoice("INV-3", yesterday),
+               invoice("INV-4", yesterday), invoice("INV-5", yesterday)])
+
+erp_server = MockERPServer().start()
+task_executor = TaskExecutionAgent(erp_client=ERPClient(base_url=erp_server.url), payment_scheduler=PaymentScheduler())
+
+print("\n🚀 Running Task Execution Agent Test...\n")
+
+print("🔹 Case 1: One batched ERP request per status change")
+results = task_executor.process_invoices([("INV-1", False), ("INV-2", False), ("INV-3", True), ("INV-404", False)])
+print(results)
+print(erp_server.payloads)
+assert results == {"approved": ["INV-1", "INV-2"], "flagged": ["INV-3"], "missing": ["INV-404"]}
+assert erp_server.payloads == [
+    {"invoices": [{"invoice_id": "INV-1", "status": "Approved"}, {"invoice_id": "INV-2", "status": "Approved"}]},
+    {"invoices": [{"invoice_id": "INV-1", "status": "Paid"}]},  # Only INV-1's payment has fallen due
+]
+assert statuses() == {"INV-1": "Approved", "INV-2": "Approved", "INV-3": "Flagged", "INV-4": "Pending",
+                      "INV-5": "Pending"}
+assert payments() == {"INV-1": "released", "INV-2": "scheduled"}
+
+print("\n🔹 Case 2: Payments stay scheduled while the ERP rejects them")
+erp_server.payloads.clear()
+erp_server.rejected_statuses = {"Paid"}
+results = task_executor.process_invoices([("INV-4", False), ("INV-5", False)])
+print(results, payments())
+assert results["approved"] == ["INV-4", "INV-5"]  # A failed release does not fail the invoices
+assert [update["status"] for payload in erp_server.payloads for update in payload["invoices"]] == ["Approved"] * 2
+assert statuses()["INV-4"] == "Approved" and payments()["INV-4"] == payments()["INV-5"] == "scheduled"
+
+print("\n🔹 Case 3: The next release sends them")
+erp_server.payloads.clear()
+erp_server.rejected_statuses = set()
+assert task_executor.release_due_payments() == 2
+print(erp_server.payloads)
+assert erp_server.payloads == [
+    {"invoices": [{"invoice_id": "INV-4", "status": "Paid"}, {"invoice_id": "INV-5", "status": "Paid"}]},
+]
+assert payments() == {"INV-1": "released", "INV-2": "scheduled", "INV-4": "released", "INV-5": "released"}
+
+erp_server.stop()
+print("\n✅ Task execution tests passed.")
@@ -0,0 +1,139 @@
+# utilities/image_preprocessing.py
+
+import hashlib
+import io
+import mmap
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; images are then uploaded unchanged
+    Image = None
+
+
+# Longest side (in pixels) sent to the model; plenty for invoice OCR
+MAX_IMAGE_DIMENSION = int(os.getenv("INVOICE_MAX_IMAGE_DIMENSION", 2048))
+JPEG_QUALITY = int(os.getenv("INVOICE_JPEG_QUALITY", 85))
+# Files smaller than this are uploaded as-is unless they exceed MAX_IMAGE_DIMENSION
+RECOMPRESS_MIN_BYTES = int(os.getenv("INVOICE_RECOMPRESS_MIN_BYTES", 1024 * 1024))
+
+# Formats Pillow can resize without extra plugins
+RESIZABLE_MIME_TYPES = {"image/jpeg", "image/png", "image/webp"}
+
+
+@dataclass
+class PreparedImage:
+    """Image payload ready to hand to the model."""
+    mime_type: str
+    data: bytes
+    digest: str  # SHA-256 of the original file bytes
+    original_size: int
+
+
+def detect_mime_type(header: bytes) -> Optional[str]:
+    """
+    Detects the file type from its leading bytes.
+
+    :param header: At least the first 12 bytes of the file.
+    :return: MIME type, or None if the format is not supported.
+    """
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[4:8] == b"ftyp":
+        brand = header[8:12]
+        if brand in (b"heic", b"heix", b"hevc", b"hevx"):
+            return "image/heic"
+        if brand in (b"mif1", b"msf1", b"heif"):
+            return "image/heif"
+    if header.startswith(b"%PDF"):
+        return "application/pdf"
+    return None
+
+
+@contextmanager
+def map_file(path: str):
+    """Memory-maps a file read-only so it can be hashed and decoded without reading it into a buffer."""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+def sniff_mime_type(path: str) -> Optional[str]:
+    """Detects the type of a file on disk from its first bytes."""
+    with open(path, "rb") as file:
+        return detect_mime_type(file.read(16))
+
+
+def file_digest(path: str) -> str:
+    """Returns the SHA-256 hex digest of a file, hashed through a memory map."""
+    with map_file(path) as mapped:
+        return hashlib.sha256(mapped).hexdigest()
+
+
+def downscale_image(source, mime_type: str, max_dimension: int, quality: int) -> Optional[bytes]:
+    """
+    Downscales and recompresses an image to JPEG.
+
+    :param source: File-like object or buffer containing the image.
+    :return: Recompressed bytes, or None if Pillow is unavailable or the image is already small.
+    """
+    if Image is None or mime_type not in RESIZABLE_MIME_TYPES:
+        return None
+
+    with Image.open(source) as image:
+        # For JPEGs, let the decoder scale down in the DCT domain (much less memory)
+        image.draft("RGB", (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=quality, optimize=True)
+        return output.getvalue()
+
+
+def prepare_image(image_path: str, max_dimension: int = MAX_IMAGE_DIMENSION,
+                  quality: int = JPEG_QUALITY) -> PreparedImage:
+    """
+    Loads an invoice image for upload.
+
+    The file is memory-mapped, hashed and type-sniffed in place. Large images
+    are downscaled to ``max_dimension`` and recompressed; anything else is
+    passed through unchanged. The result holds raw bytes (no base64).
+
+    :raises ValueError: If the file type is not supported.
+    """
+    with map_file(image_path) as mapped:
+        mime_type = detect_mime_type(mapped[:16])
+        if mime_type is None:
+            raise ValueError(f"Unsupported file type for '{image_path}'.")
+
+        digest = hashlib.sha256(mapped).hexdigest()
+        original_size = len(mapped)
+
+        data = None
+        if mime_type in RESIZABLE_MIME_TYPES and Image is not None:
+            # Opening only parses the header; pixels are not decoded here
+            with Image.open(mapped) as probe:
+                width, height = probe.size
+            if original_size >= RECOMPRESS_MIN_BYTES or max(width, height) > max_dimension:
+                mapped.seek(0)
+                data = downscale_image(mapped, mime_type, max_dimension, quality)
+
+        if data is not None and len(data) < original_size:
+            mime_type = "image/jpeg"
+        else:
+            data = bytes(mapped)
+
+    return PreparedImage(mime_type=mime_type, data=data, digest=digest, original_size=original_size)
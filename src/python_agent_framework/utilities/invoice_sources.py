@@ -0,0 +1,66 @@
+# utilities/invoice_sources.py
+
+import glob
+import os
+from typing import List
+
+
+# File types accepted by the document processor
+INVOICE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".heic", ".heif", ".pdf"}
+
+GLOB_CHARACTERS = set("*?[")
+
+
+def is_invoice_file(path: str) -> bool:
+    """Returns True if the path points to a file with a supported invoice extension."""
+    return os.path.isfile(path) and os.path.splitext(path)[1].lower() in INVOICE_EXTENSIONS
+
+
+def read_manifest(manifest_path: str) -> List[str]:
+    """
+    Reads a manifest file listing one invoice path per line.
+
+    Blank lines and lines starting with '#' are ignored. Relative paths are
+    resolved against the directory containing the manifest.
+
+    :param manifest_path: Path to the manifest file.
+    :return: List of invoice paths in manifest order.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    paths = []
+    with open(manifest_path, "r", encoding="utf-8") as manifest:
+        for line in manifest:
+            entry = line.strip()
+            if not entry or entry.startswith("#"):
+                continue
+            if not os.path.isabs(entry):
+                entry = os.path.join(base_dir, entry)
+            paths.append(entry)
+    return paths
+
+
+def collect_invoice_paths(source: str) -> List[str]:
+    """
+    Resolves a batch source into an ordered list of invoice paths.
+
+    The source may be a directory (all supported files directly inside it),
+    a glob pattern (``**`` is supported) or a manifest file.
+
+    :param source: Directory, glob pattern or manifest path.
+    :return: Sorted (or manifest-ordered) list of invoice paths.
+    """
+    if os.path.isdir(source):
+        return sorted(
+            entry.path for entry in os.scandir(source)
+            if is_invoice_file(entry.path)
+        )
+
+    if GLOB_CHARACTERS & set(source):
+        return sorted(path for path in glob.glob(source, recursive=True) if is_invoice_file(path))
+
+    if os.path.isfile(source):
+        if os.path.splitext(source)[1].lower() in INVOICE_EXTENSIONS:
+            return [source]
+        return read_manifest(source)
+
+    raise FileNotFoundError(f"Batch source '{source}' does not exist.")
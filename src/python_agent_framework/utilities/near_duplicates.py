@@ -0,0 +1,232 @@
+# utilities/near_duplicates.py
+
+import functools
+import math
+import random
+import re
+import zlib
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Set
+from utilities.lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+
+# Relative width of an amount bucket; neighbouring buckets cover totals within ~2%
+AMOUNT_TOLERANCE = 0.02
+# Due dates this many days apart are still considered the same billing event
+DATE_WINDOW_DAYS = 7
+# MinHash signature length (estimation error ~ 1/sqrt(32))
+NUM_PERMUTATIONS = 32
+# Vendor word similarity considered the same vendor
+VENDOR_SIMILARITY_THRESHOLD = 0.8
+# Estimated line-item Jaccard similarity that confirms a partial vendor match (e.g. "Acme" vs "Acme Supplies")
+ITEM_SIMILARITY_THRESHOLD = 0.6
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20250101)  # Fixed seed: signatures must be stable across processes
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+# Shingles hashed per vectorized block in minhash_signatures (bounds the (shingles x permutations) arrays)
+SIGNATURE_BLOCK_SHINGLES = 16384
+
+_VENDOR_STOPWORDS = {
+    "and", "the", "of", "co", "company", "corp", "corporation", "inc", "incorporated",
+    "llc", "llp", "ltd", "limited", "plc", "gmbh", "sa", "ag", "bv", "pty",
+}
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def vendor_tokens(vendor: Optional[str]) -> List[str]:
+    """Lowercased vendor words without punctuation, legal suffixes or filler words."""
+    if not vendor:
+        return []
+    return sorted({word for word in _WORD.findall(vendor.lower()) if word not in _VENDOR_STOPWORDS})
+
+
+def amount_bucket(amount: Optional[float]) -> Optional[int]:
+    """Logarithmic bucket of an amount; totals within AMOUNT_TOLERANCE land in the same or adjacent bucket."""
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        return None
+    if amount == 0:
+        return 0
+    bucket = int(math.floor(math.log(abs(amount)) / math.log1p(AMOUNT_TOLERANCE))) + 1
+    return bucket if amount > 0 else -bucket
+
+
+def due_day(due_date: Optional[str]) -> Optional[int]:
+    """Due date as a day ordinal, or None if it is missing or not ISO formatted."""
+    try:
+        return date.fromisoformat(due_date).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def line_item_shingles(line_items: Optional[Iterable[Dict[str, Any]]]) -> Set[str]:
+    """Word unigrams and bigrams of all line item descriptions."""
+    shingles = set()
+    for item in line_items or []:
+        words = _WORD.findall(str(item.get("Item") or "").lower())
+        shingles.update(words)
+        shingles.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+    return shingles
+
+
+def minhash_signature(shingles: Set[str]) -> Optional[List[int]]:
+    """MinHash signature of a shingle set (None for an empty set)."""
+    if not shingles:
+        return None
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles]
+    return [
+        min((a * value + b) % _MERSENNE_PRIME for value in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+@functools.lru_cache(maxsize=None)
+def _permutation_arrays():
+    """The permutation coefficients as uint64 arrays: (low 32 bits of a, high 29 bits of a, b)."""
+    a = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64)
+    b = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64)
+    return a & np.uint64(0xFFFFFFFF), a >> np.uint64(32), b
+
+
+def _fold(values):
+    """Partially reduces uint64 values modulo 2**61 - 1 in place (the result is below 2**61 + 8)."""
+    carry = values >> np.uint64(61)
+    values &= np.uint64(_MERSENNE_PRIME)
+    values += carry
+
+
+def _permuted_hashes(hashes):
+    """
+    ``(a * hash + b) % (2**61 - 1)`` for every hash and permutation, as a (shingles x permutations) array.
+
+    ``a * hash`` needs up to 93 bits, so ``a`` is split into 32-bit halves and
+    the partial products are folded with ``2**61 = 1 (mod 2**61 - 1)``; the
+    result equals minhash_signature's arbitrary-precision arithmetic exactly.
+    """
+    a_low, a_high, b = _permutation_arrays()
+    hashes = hashes[:, None]
+    values = a_low * hashes  # < 2**64
+    _fold(values)
+    high = a_high * hashes  # < 2**61, still to be multiplied by 2**32
+    carry = high >> np.uint64(29)
+    high &= np.uint64((1 << 29) - 1)
+    high <<= np.uint64(32)
+    values += high
+    values += carry
+    values += b  # < 2**63
+    _fold(values)
+    np.subtract(values, np.uint64(_MERSENNE_PRIME), out=values, where=values >= np.uint64(_MERSENNE_PRIME))
+    return values
+
+
+def minhash_signatures(shingle_sets: Iterable[Set[str]]) -> List[Optional[List[int]]]:
+    """
+    MinHash signatures of many shingle sets at once; same values as minhash_signature.
+
+    Each distinct shingle of a block of sets is hashed and permuted once with
+    numpy (descriptions repeat across a vendor's invoices), and the permuted
+    values are reduced per set, instead of one Python loop per shingle and
+    permutation.
+    """
+    shingle_sets = list(shingle_sets)
+    signatures: List[Optional[List[int]]] = [None] * len(shingle_sets)
+    vocabulary: Dict[str, int] = {}  # shingle -> row in the block's permuted hashes
+    rows, offsets, owners = [], [], []
+
+    def reduce_block():
+        if not owners:
+            return
+        hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in vocabulary),
+                             dtype=np.uint64, count=len(vocabulary))
+        permuted = _permuted_hashes(hashes)[np.array(rows, dtype=np.intp)]
+        for owner, signature in zip(owners, np.minimum.reduceat(permuted, offsets, axis=0).tolist()):
+            signatures[owner] = signature
+        vocabulary.clear()
+        rows.clear()
+        offsets.clear()
+        owners.clear()
+
+    for index, shingles in enumerate(shingle_sets):
+        if not shingles:
+            continue
+        offsets.append(len(rows))
+        owners.append(index)
+        rows.extend(vocabulary.setdefault(shingle, len(vocabulary)) for shingle in shingles)
+        if len(rows) >= SIGNATURE_BLOCK_SHINGLES:
+            reduce_block()
+    reduce_block()
+    return signatures
+
+
+def signature_similarity(first: Optional[List[int]], second: Optional[List[int]]) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    if not first or not second:
+        return 0.0
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+def vendor_similarity(first: Optional[str], second: Optional[str]) -> float:
+    """Jaccard similarity of the normalized vendor words."""
+    first_tokens, second_tokens = set(vendor_tokens(first)), set(vendor_tokens(second))
+    if not first_tokens or not second_tokens:
+        return 0.0
+    return len(first_tokens & second_tokens) / len(first_tokens | second_tokens)
+
+
+def fingerprint(invoice_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Computes every near-duplicate feature of an invoice."""
+    return {
+        "amount_bucket": amount_bucket(invoice_data.get("Total_Amount")),
+        "due_day": due_day(invoice_data.get("Due_Date")),
+        "signature": minhash_signature(line_item_shingles(invoice_data.get("Line_Items"))),
+    }
+
+
+def fingerprints(invoices: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """fingerprint for many invoices, with the MinHash signatures computed in one vectorized pass."""
+    invoices = list(invoices)
+    signatures = minhash_signatures(line_item_shingles(invoice_data.get("Line_Items")) for invoice_data in invoices)
+    return [
+        {
+            "amount_bucket": amount_bucket(invoice_data.get("Total_Amount")),
+            "due_day": due_day(invoice_data.get("Due_Date")),
+            "signature": signature,
+        }
+        for invoice_data, signature in zip(invoices, signatures)
+    ]
+
+
+def is_near_duplicate(invoice: Dict[str, Any], candidate: Dict[str, Any]) -> bool:
+    """
+    Decides whether a candidate from the (amount, due date) neighbourhood is a near-duplicate.
+
+    Both dictionaries carry "Vendor", "Total_Amount", "due_day" and "signature".
+    Totals within AMOUNT_TOLERANCE and due dates within DATE_WINDOW_DAYS are
+    required (so recurring monthly bills never match), plus the same vendor.
+    Vendor names only partly alike (sharing some words) also match when the
+    line items are similar; similar items alone never do, since generic
+    descriptions ("Monthly subscription") recur across unrelated vendors.
+    """
+    total, candidate_total = invoice.get("Total_Amount"), candidate.get("Total_Amount")
+    if total is None or candidate_total is None:
+        return False
+    if abs(total - candidate_total) > AMOUNT_TOLERANCE * max(abs(total), abs(candidate_total)):
+        return False
+
+    if (invoice.get("due_day") is None or candidate.get("due_day") is None
+            or abs(invoice["due_day"] - candidate["due_day"]) > DATE_WINDOW_DAYS):
+        return False
+
+    vendors = vendor_similarity(invoice.get("Vendor"), candidate.get("Vendor"))
+    if vendors >= VENDOR_SIMILARITY_THRESHOLD:
+        return True
+    return (vendors > 0
+            and signature_similarity(invoice.get("signature"), candidate.get("signature")) >= ITEM_SIMILARITY_THRESHOLD)
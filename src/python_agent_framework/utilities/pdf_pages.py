@@ -0,0 +1,63 @@
+# utilities/pdf_pages.py
+
+import io
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+# Header fields are taken from the first page that has them, totals from the last
+HEADER_FIELDS = ("Invoice_ID", "Vendor", "Due_Date")
+TOTAL_FIELDS = ("Total_Amount", "Tax")
+
+
+def iter_pdf_pages(pdf_path: str) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    Lazily slices a PDF into standalone single-page PDFs.
+
+    Only one page is materialized per iteration step, so memory stays bounded
+    by how many pages the caller keeps in flight.
+
+    :param pdf_path: Path to the PDF file.
+    :return: Iterator of (page_number, page_count, single_page_pdf_bytes); page numbers start at 1.
+    """
+    try:
+        from pypdf import PdfReader, PdfWriter  # Slow to import and only needed for PDF invoices
+    except ImportError:
+        raise ImportError("pypdf is required to process PDF invoices. Install it with 'pip install pypdf'.") from None
+
+    with open(pdf_path, "rb") as pdf_file:
+        reader = PdfReader(pdf_file)
+        page_count = len(reader.pages)
+        for index in range(page_count):
+            writer = PdfWriter()
+            writer.add_page(reader.pages[index])
+            output = io.BytesIO()
+            writer.write(output)
+            yield index + 1, page_count, output.getvalue()
+
+
+def merge_page_extractions(pages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merges per-page extractions (in page order) into one invoice record.
+
+    :param pages: Extracted dictionaries ordered by page number.
+    :return: Single invoice dictionary with all line items concatenated.
+    """
+    invoice = {
+        "Invoice_ID": None,
+        "Vendor": None,
+        "Total_Amount": None,
+        "Tax": None,
+        "Due_Date": None,
+        "Line_Items": [],
+    }
+
+    for page in pages:
+        for field in HEADER_FIELDS:
+            if invoice[field] in (None, "") and page.get(field) not in (None, ""):
+                invoice[field] = page[field]
+        for field in TOTAL_FIELDS:
+            if page.get(field) is not None:
+                invoice[field] = page[field]
+        invoice["Line_Items"].extend(page.get("Line_Items") or [])
+
+    return invoice
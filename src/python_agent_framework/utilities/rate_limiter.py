@@ -0,0 +1,54 @@
+# utilities/rate_limiter.py
+
+import asyncio
+import threading
+import time
+import weakref
+
+
+class AsyncRateLimiter:
+    """
+    Token-bucket rate limiter for coroutines.
+
+    Allows ``rate`` acquisitions per ``period`` seconds, with bursts of up to
+    ``burst`` acquisitions (defaults to ``rate``). The bucket may be shared
+    by several event loops (e.g. one ``asyncio.run`` per worker thread):
+    each loop queues its coroutines on its own ``asyncio.Lock``, since such
+    locks are bound to the loop that first uses them.
+    """
+
+    def __init__(self, rate: float, period: float = 1.0, burst: float = None):
+        if rate <= 0:
+            raise ValueError("Rate must be positive.")
+        self.rate = rate
+        self.period = period
+        self.capacity = burst if burst is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._locks = weakref.WeakKeyDictionary()  # event loop -> asyncio.Lock
+        self._state_lock = threading.Lock()  # Guards the bucket across loops running in different threads
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate / self.period)
+        self._updated = now
+
+    def _loop_lock(self):
+        loop = asyncio.get_running_loop()
+        with self._state_lock:
+            lock = self._locks.get(loop)
+            if lock is None:
+                lock = self._locks[loop] = asyncio.Lock()
+            return lock
+
+    async def acquire(self):
+        """Waits until a token is available and consumes it."""
+        async with self._loop_lock():
+            while True:
+                with self._state_lock:
+                    self._refill()
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) * self.period / self.rate
+                await asyncio.sleep(wait)
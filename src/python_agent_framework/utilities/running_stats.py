@@ -0,0 +1,48 @@
+# utilities/running_stats.py
+
+import math
+from typing import Optional, Tuple
+
+
+def welford_add(count: int, mean: float, m2: float, value: float) -> Tuple[int, float, float]:
+    """
+    Adds one observation to running (count, mean, M2) statistics (Welford's algorithm).
+
+    :return: Updated (count, mean, m2).
+    """
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    m2 += delta * (value - mean)
+    return count, mean, m2
+
+
+def welford_remove(count: int, mean: float, m2: float, value: float) -> Tuple[int, float, float]:
+    """
+    Removes a previously added observation from running statistics (inverse of welford_add).
+
+    :return: Updated (count, mean, m2).
+    """
+    if count <= 1:
+        return 0, 0.0, 0.0
+    previous_mean = (count * mean - value) / (count - 1)
+    m2 -= (value - mean) * (value - previous_mean)
+    return count - 1, previous_mean, max(m2, 0.0)
+
+
+def stddev(count: int, m2: float) -> float:
+    """Sample standard deviation from running statistics."""
+    return math.sqrt(m2 / (count - 1)) if count > 1 else 0.0
+
+
+def z_score(value: float, count: int, mean: float, m2: float, min_std: float = 0.0) -> Optional[float]:
+    """
+    Standard score of ``value`` against running statistics.
+
+    ``min_std`` keeps near-constant histories from turning tiny deviations into
+    huge scores. Returns None when there is no spread to compare against.
+    """
+    spread = max(stddev(count, m2), min_std)
+    if spread == 0:
+        return None
+    return (value - mean) / spread
@@ -0,0 +1,122 @@
+# utilities/startup_profile.py
+
+import argparse
+import os
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Directory holding main.py; the profiled interpreter imports modules from here
+FRAMEWORK_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class ImportTiming:
+    """One line of ``python -X importtime`` output."""
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int  # 0 for the profiled module, 1 for its direct imports, ...
+
+
+def parse_importtime(output: str, module: str) -> List[ImportTiming]:
+    """
+    Extracts the import tree of ``module`` from ``-X importtime`` output.
+
+    Modules the interpreter imported before ``module`` (site, encodings, ...)
+    are left out.
+
+    :return: Timings in the order they were reported (children before their parent).
+    """
+    timings, pending = [], []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_field, cumulative_field, name_field = line[len("import time:"):].split("|", 2)
+        if not self_field.strip().isdigit():
+            continue  # Column header
+        name = name_field.strip()
+        depth = (len(name_field) - len(name_field.lstrip()) - 1) // 2
+        pending.append(ImportTiming(name, int(self_field), int(cumulative_field), depth))
+        if depth == 0:
+            if name == module:
+                timings = pending
+            pending = []
+    return timings
+
+
+def profile_startup(module: str = "main", repeat: int = 3, python: str = sys.executable) -> List[ImportTiming]:
+    """
+    Imports ``module`` in fresh interpreters under ``-X importtime``.
+
+    :param repeat: Number of runs; the fastest one is returned to reduce noise.
+    :return: Import timings of the fastest run.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [FRAMEWORK_ROOT, env.get("PYTHONPATH")]))
+    best = None
+    for _ in range(max(1, repeat)):
+        completed = subprocess.run(
+            [python, "-X", "importtime", "-c", f"import {module}"],
+            cwd=FRAMEWORK_ROOT, env=env, capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{completed.stderr.strip().splitlines()[-1]}")
+        timings = parse_importtime(completed.stderr, module)
+        if best is None or total_us(timings) < total_us(best):
+            best = timings
+    return best
+
+
+def total_us(timings: List[ImportTiming]) -> int:
+    """Total import time of the profiled module in microseconds."""
+    return next((timing.cumulative_us for timing in timings if timing.depth == 0), 0)
+
+
+def package_totals(timings: List[ImportTiming]) -> Dict[str, int]:
+    """Sums self time per top-level package (e.g. all ``google.*`` modules under "google")."""
+    totals = {}
+    for timing in timings:
+        package = timing.name.split(".")[0]
+        totals[package] = totals.get(package, 0) + timing.self_us
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def format_report(timings: List[ImportTiming], top: int = 15) -> str:
+    """Formats the slowest modules and packages of a startup profile."""
+    lines = [f"⏱️ Startup import time: {total_us(timings) / 1000:.1f} ms ({len(timings)} modules)", ""]
+
+    lines.append(f"Slowest imports (cumulative, top {top}):")
+    for timing in sorted(timings, key=lambda timing: timing.cumulative_us, reverse=True)[:top]:
+        lines.append(f"  {timing.cumulative_us / 1000:9.1f} ms  {'  ' * timing.depth}{timing.name}")
+
+    lines.append("")
+    lines.append(f"Packages by own import time (top {top}):")
+    for package, self_us in list(package_totals(timings).items())[:top]:
+        lines.append(f"  {self_us / 1000:9.1f} ms  {package}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measures the import time of the invoice assistant.")
+    parser.add_argument("--module", default="main", help="Module to import (default: main).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs to take the fastest of (default: 3).")
+    parser.add_argument("--top", type=int, default=15, help="Rows per table in the report (default: 15).")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        help="Exit with status 1 if the import takes longer than this; use it to catch startup regressions.",
+    )
+    args = parser.parse_args(argv)
+
+    timings = profile_startup(args.module, args.repeat)
+    print(format_report(timings, args.top))
+    if args.budget_ms is not None and total_us(timings) / 1000 > args.budget_ms:
+        print(f"\n❌ Startup import time exceeds the {args.budget_ms:.0f} ms budget.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())